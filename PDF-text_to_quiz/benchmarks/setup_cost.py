@@ -0,0 +1,148 @@
+# Per-request setup cost of quiz generation, and the connections it opens,
+# against a local stand-in for the OpenAI API (no network or API key needed).
+#
+#   python benchmarks/setup_cost.py --pages 200 --num-questions 5
+#
+# "per call" builds a new chat model, HTTP client and chain for every page, as
+# generate_quizz used to; "shared" goes through the process-wide model
+# registry and the chain cache. For each it reports the median time spent
+# building the model and the chain, the time to generate every page (ten at
+# a time, like pdf_to_quizz), and how many TCP connections and requests the
+# server saw. With a client per call an occasional request stalls; those time
+# out after 10 s and are retried, which shows up as extra requests.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+
+def completion_text(num_questions):
+    return "\n\n".join(
+        f"Question {i}: What does command {i} do?\nCHOICE_A: one\nCHOICE_B: two\nCHOICE_C: three\nCHOICE_D: four\nAnswer: A"
+        for i in range(1, num_questions + 1)
+    )
+
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True
+    connections = 0
+    requests = 0
+    latency = 0.0
+    num_questions = 5
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        type(self).requests += 1
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        body = json.dumps({
+            "id": "chatcmpl-setup-cost", "object": "chat.completion", "created": int(time.time()),
+            "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": completion_text(self.num_questions)}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 200, "total_tokens": 700},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+
+# the setup generate_quizz did before the registry: a new model (and HTTP client) and chain per call
+def per_call_chain(num_questions):
+    from langchain_openai import ChatOpenAI
+    from src.llm.qcm_chain import QCMGenerateChain
+    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=os.getenv("OPENAI_API_KEY"),
+                     base_url=os.getenv("OPENAI_BASE_URL"), timeout=10)
+    return QCMGenerateChain.from_llm(llm, num_questions=num_questions)
+
+
+
+def shared_chain(num_questions):
+    from src.generators.quiz_generator import get_chain
+    return get_chain(num_questions)
+
+
+
+async def run(build, pages, num_questions, concurrency):
+    from src.generators.quiz_generator import llm_call
+    sem = asyncio.Semaphore(concurrency)
+    setups = []
+
+    async def page(i):
+        async with sem:
+            start = time.perf_counter()
+            chain = build(num_questions)
+            setups.append(time.perf_counter() - start)
+            return await llm_call(chain, [{"doc": f"page {i} of the document", "num_questions": num_questions}])
+
+    FakeOpenAI.connections = FakeOpenAI.requests = 0
+    start = time.perf_counter()
+    results = await asyncio.gather(*[page(i) for i in range(pages)])
+    elapsed = time.perf_counter() - start
+    parsed = sum(1 for result in results if result and result[0] and "question1" in result[0][0])
+    return {"setup_ms": 1000 * statistics.median(setups), "total_s": elapsed,
+            "connections": FakeOpenAI.connections, "requests": FakeOpenAI.requests, "parsed": parsed}
+
+
+
+async def main_async(args):
+    from src.llm.qa_llm import close_http_clients
+    results = {}
+    for label, build in (("per call", per_call_chain), ("shared", shared_chain)):
+        # first call imports and warms up outside the measurement
+        build(args.num_questions)
+        results[label] = await run(build, args.pages, args.num_questions, args.concurrency)
+    await close_http_clients()
+    return results
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50, help="response time of the stand-in API")
+    args = parser.parse_args()
+
+    FakeOpenAI.latency = args.latency_ms / 1000
+    FakeOpenAI.num_questions = args.num_questions
+    # a deep accept queue: the per-call clients all connect at once
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "setup-cost")
+
+    results = asyncio.run(main_async(args))
+    server.shutdown()
+
+    print(f"{'':>9} | {'setup ms':>9} | {'total s':>8} | {'connections':>11} | {'requests':>8} | {'parsed':>6}")
+    for label, result in results.items():
+        print(f"{label:>9} | {result['setup_ms']:9.3f} | {result['total_s']:8.2f} | "
+              f"{result['connections']:>11} | {result['requests']:>8} | {result['parsed']:>6}")
+
+
+
+if __name__ == "__main__":
+    main()
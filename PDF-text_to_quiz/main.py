@@ -1,14 +1,26 @@
 from fastapi import FastAPI, UploadFile, File, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import shutil
 import os
+import json
+import time
 import tempfile
-from src.parsers.pdf_to_quiz import pdf_to_quizz
-from src.generators.quiz_generator import generate_quizz
-from src.utils.ui_utils import transform
+from contextlib import asynccontextmanager
+from src.parsers.pdf_to_quiz import pdf_to_quizz_with_meta, stream_pdf_quizz
+from src.parsers.text_to_quiz import stream_text_quizz, text_to_quizz_with_meta
+from src.llm.qa_llm import close_http_clients
+from src.utils import metrics
 
-app = FastAPI() # using a single fastapi instance to manage both the apis simultaneously
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_http_clients()   # the pooled OpenAI connections
+
+
+app = FastAPI(lifespan=lifespan) # using a single fastapi instance to manage both the apis simultaneously
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,13 +49,13 @@ async def generate_quiz_from_pdf(
 
         try:
             print(f"Starting quiz generation from {file.filename} with {num_questions} questions")
-            questions = await pdf_to_quizz(temp_file_path, num_questions)
+            questions, metadata = await pdf_to_quizz_with_meta(temp_file_path, num_questions)
             
             if not questions:
-                return {"questions": [], "message": "No questions could be generated"}
+                return {"questions": [], "message": "No questions could be generated", "metadata": metadata}
                 
             print(f"Successfully generated {len(questions)} questions")
-            return {"questions": questions}
+            return {"questions": questions, "metadata": metadata}
             
         finally:
             if os.path.exists(temp_file_path):
@@ -61,32 +73,121 @@ async def generate_quiz_from_pdf(
 
 
 
-# Text to Quiz Endpoint
-class QuizRequest(BaseModel):
-    content: str
-    num_questions: int
+# Streaming variants: one JSON object per line, sent as it happens
+#   {"event": "question", "index": 1, "question": {...}, "elapsed_ms": ...}
+#   {"event": "progress", "chunks_done", "chunks_total", "pages_done", "pages_total"}
+#   {"event": "done", "questions", "time_to_first_question_ms", "total_ms", "metadata"}
+#   {"event": "error", "error": "..."}
+def ndjson(event: dict) -> str:
+    return json.dumps(event) + "\n"
+
 
-async def txt_to_quizz(content: str, num_questions: int):
-    quizz = await generate_quizz(content, num_questions)
-    
-    if quizz and isinstance(quizz, list) and quizz[0]:
-        input_list = quizz[0]
 
-        if isinstance(input_list, list) and isinstance(input_list[0], dict):
-            if "question1" in input_list[0]:  
-                transformed_quizz = transform(input_list, num_questions)
+async def quiz_event_stream(events, meta: dict):
+    start = time.perf_counter()
+    first_question, count = None, 0
+    try:
+        async for event, data in events:
+            elapsed = time.perf_counter() - start
+            if event == "question":
+                count += 1
+                if first_question is None:
+                    first_question = elapsed
+                    metrics.observe("time_to_first_question", elapsed)
+                yield ndjson({"event": "question", "index": count, "question": data,
+                              "elapsed_ms": round(1000 * elapsed, 1)})
             else:
-                transformed_quizz = input_list  
-        else:
-            transformed_quizz = []
+                yield ndjson({"event": "progress", **data})
+
+        total = time.perf_counter() - start
+        metrics.observe("quiz_stream_total", total)
+        yield ndjson({"event": "done", "questions": count,
+                      "time_to_first_question_ms": None if first_question is None else round(1000 * first_question, 1),
+                      "total_ms": round(1000 * total, 1), "metadata": meta})
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        yield ndjson({"event": "error", "error": str(e)})
+
+
+
+# Removes a file once the response is over, however it ends: a client that
+# disconnects before the stream starts never runs the generator, and
+# Starlette skips background tasks when the disconnect raises.
+class CleanupStreamingResponse(StreamingResponse):
+
+    def __init__(self, *args, cleanup_path: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cleanup_path = cleanup_path
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.cleanup_path and os.path.exists(self.cleanup_path):
+                os.unlink(self.cleanup_path)
+
 
-        return transformed_quizz
 
-    return []
+def streaming_response(stream, cleanup_path: str = None) -> StreamingResponse:
+    # no-buffering header for nginx, so each line reaches the client when written
+    return CleanupStreamingResponse(stream, media_type="application/x-ndjson", cleanup_path=cleanup_path,
+                                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+
+@app.post("/pdf_to_quizz/stream")
+async def stream_quiz_from_pdf(
+    file: UploadFile = File(...),
+    num_questions: int = Query(5, ge=1, le=20)
+):
+    suffix = os.path.splitext(file.filename)[1].lower()
+    if suffix != '.pdf':
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+
+    # the upload is gone once this returns, so it is saved first and removed when the response ends
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        try:
+            shutil.copyfileobj(file.file, temp_file)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+        temp_file_path = temp_file.name
+
+    print(f"Streaming quiz generation from {file.filename} with {num_questions} questions")
+    meta = {}
+    return streaming_response(quiz_event_stream(stream_pdf_quizz(temp_file_path, num_questions, meta), meta),
+                              cleanup_path=temp_file_path)
+
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.summary()
+
 
 
 
 
+# Text to Quiz Endpoint
+class QuizRequest(BaseModel):
+    content: str
+    num_questions: int
+
+
+
 @app.post("/text_to_quizz/")
 async def generate_text_quizz(request: QuizRequest):
-    return await txt_to_quizz(request.content, request.num_questions)
\ No newline at end of file
+    # planned and cached by chunk like the streaming variant
+    questions, _ = await text_to_quizz_with_meta(request.content, request.num_questions)
+    return questions
+
+
+
+
+@app.post("/text_to_quizz/stream")
+async def stream_text_quizz_endpoint(request: QuizRequest):
+    meta = {}
+    return streaming_response(quiz_event_stream(stream_text_quizz(request.content, request.num_questions, meta), meta))
@@ -0,0 +1,102 @@
+import asyncio
+import re
+from typing import Awaitable, Callable, List
+
+
+CHOICES = ("A", "B", "C", "D")
+
+
+
+def _clean(value) -> str:
+    # the QCM regex keeps the ":" that follows CHOICE_X
+    return str(value or "").strip().lstrip(":").strip()
+
+
+
+# a question is usable when it has text, four choices and an answer letter
+def is_valid_question(question: dict) -> bool:
+    if not isinstance(question, dict) or not _clean(question.get("question")):
+        return False
+    if not all(_clean(question.get(choice)) for choice in CHOICES):
+        return False
+    return _clean(question.get("reponse"))[:1].upper() in CHOICES
+
+
+
+def question_key(question: dict) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", _clean(question["question"]).casefold()).split())
+
+
+
+# Runs `generate(job)` for every job, at most `concurrency` at a time, and
+# takes the questions as each call finishes rather than waiting for all of
+# them. Invalid and duplicate questions are dropped; once `num_questions`
+# remain, the calls still running are cancelled and those not started never
+# run. Yields ("question", question) for each question kept, as soon as its
+# call is parsed, and ("progress", job) after each call; counts go to `meta`.
+# "questions_generated" counts every valid, distinct question the calls
+# returned, "questions_returned" the ones yielded: at most `num_questions`.
+async def stream_questions(jobs: list, generate: Callable[[object], Awaitable[List[dict]]],
+                           num_questions: int, meta: dict, concurrency: int = 10):
+    sem = asyncio.Semaphore(concurrency)
+    started, consumed = set(), set()
+
+    async def run(i, job):
+        async with sem:
+            started.add(i)
+            try:
+                return i, await generate(job)
+            except Exception as e:
+                print(f"Error generating questions for job {i+1}: {str(e)}")
+                return i, None
+
+    tasks = [asyncio.create_task(run(i, job)) for i, job in enumerate(jobs)]
+    seen = set()
+    meta.update({"llm_calls_planned": len(jobs), "llm_calls_completed": 0, "llm_calls_failed": 0,
+                 "llm_calls_cancelled": 0, "llm_calls_saved": 0, "invalid_dropped": 0, "duplicates_dropped": 0,
+                 "questions_generated": 0, "questions_returned": 0})
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            i, generated = await next_done
+            consumed.add(i)
+            if generated is None:
+                meta["llm_calls_failed"] += 1
+            else:
+                meta["llm_calls_completed"] += 1
+
+            for question in generated or []:
+                if not is_valid_question(question):
+                    meta["invalid_dropped"] += 1
+                elif question_key(question) in seen:
+                    meta["duplicates_dropped"] += 1
+                else:
+                    seen.add(question_key(question))
+                    meta["questions_generated"] += 1
+                    if meta["questions_returned"] < num_questions:
+                        meta["questions_returned"] += 1
+                        yield "question", question
+            yield "progress", jobs[i]
+
+            if meta["questions_returned"] >= num_questions:
+                break
+    finally:
+        for i, task in enumerate(tasks):
+            if not task.done():
+                task.cancel()
+                meta["llm_calls_cancelled" if i in started else "llm_calls_saved"] += 1
+            elif i not in consumed:
+                # finished alongside the call that completed the quiz
+                meta["llm_calls_failed" if task.result()[1] is None else "llm_calls_completed"] += 1
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+
+# the same, all at once: returns (questions, metadata)
+async def collect_questions(jobs: list, generate: Callable[[object], Awaitable[List[dict]]],
+                            num_questions: int, concurrency: int = 10):
+    questions, meta = [], {}
+    async for event, data in stream_questions(jobs, generate, num_questions, meta, concurrency):
+        if event == "question":
+            questions.append(data)
+    return questions, meta
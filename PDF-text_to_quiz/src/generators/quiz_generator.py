@@ -1,5 +1,6 @@
 import asyncio
-from src.llm.qa_llm import QaLlm
+from functools import lru_cache
+from src.llm.qa_llm import get_llm
 from src.llm.qcm_chain import QCMGenerateChain
 
 
@@ -12,18 +13,20 @@ async def llm_call(qa_chain: QCMGenerateChain, text: list):
 
 
 
-async def generate_quizz(content: str, num_questions: int = 5):
-    # Generates a quiz from the given content.
-    print("Debug: Calling QaLlm()...")  
-    qa_llm = QaLlm()  
-
-    llm_instance = qa_llm.get_llm()  
-    print(f"Debug: LLM Instance: {llm_instance}")  
-
+# The chain (prompt and output regex) only depends on the number of questions,
+# and the chat model is shared by the whole process, so each chain is built
+# once and reused by every request and every page.
+@lru_cache(maxsize=32)
+def get_chain(num_questions: int) -> QCMGenerateChain:
+    llm_instance = get_llm()
     if llm_instance is None:
         raise ValueError("LLM instance is None. Check API key or initialization!")
 
-    qa_chain = QCMGenerateChain.from_llm(llm_instance, num_questions=num_questions)
-    print(f"Debug: QA Chain Created: {qa_chain}")  
+    return QCMGenerateChain.from_llm(llm_instance, num_questions=num_questions)
 
-    return await llm_call(qa_chain, [{"doc": content, "num_questions": num_questions}])
\ No newline at end of file
+
+
+async def generate_quizz(content: str, num_questions: int = 5):
+    # Generates a quiz from the given content.
+    qa_chain = get_chain(num_questions)
+    return await llm_call(qa_chain, [{"doc": content, "num_questions": num_questions}])
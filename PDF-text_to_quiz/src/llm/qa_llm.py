@@ -1,20 +1,83 @@
 import os
+import threading
+import httpx
 from dotenv import load_dotenv
-from langchain_community.chat_models import ChatOpenAI  
+from langchain_openai import ChatOpenAI
 
 load_dotenv()
 
-# from langchain_openai import ChatOpenAI
+
+# HTTP connection pool shared by every request of the process
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", 20))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", 10))
+KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", 60))
+REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", 120))
+
+
+# Process-wide registry of chat models, one per (model, temperature). They
+# all send their requests through the same pair of HTTP clients, so the
+# pages of a PDF reuse kept-alive connections instead of each opening its own.
+_models = {}
+_clients = {}
+_lock = threading.Lock()
+
+
+
+def _limits():
+    return httpx.Limits(max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+
+def get_http_clients():
+    with _lock:
+        if not _clients:
+            _clients["sync"] = httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT)
+            _clients["async"] = httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT)
+        return _clients["sync"], _clients["async"]
+
+
+
+def get_llm(model_name: str = "gpt-3.5-turbo", temperature: float = 0):
+    key = (model_name, temperature)
+    llm = _models.get(key)
+    if llm is None:
+        http_client, http_async_client = get_http_clients()
+        with _lock:
+            llm = _models.get(key)
+            if llm is None:
+                llm = _models[key] = ChatOpenAI(
+                    temperature=temperature,
+                    model_name=model_name,
+                    openai_api_key=os.getenv("OPENAI_API_KEY"),
+                    base_url=os.getenv("OPENAI_BASE_URL"),
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                )
+    return llm
+
+
+
+# Closes the pooled connections on application shutdown. The models and
+# chains built on them go too, so a later startup in the same process (a
+# reload, a second test client) builds new ones on fresh clients.
+async def close_http_clients():
+    from src.generators.quiz_generator import get_chain
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+        _models.clear()
+    get_chain.cache_clear()
+    if clients:
+        clients["sync"].close()
+        await clients["async"].aclose()
+
+
 
 class QaLlm():
     def __init__(self) -> None:
-        self.llm = ChatOpenAI(
-            temperature=0, 
-            model_name="gpt-3.5-turbo",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
-        )
+        self.llm = get_llm()
 
     def get_llm(self):
         return self.llm
-
-
@@ -0,0 +1,137 @@
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# gpt-3.5-turbo has a 16k context. A chunk fills what is left of it after the
+# prompt and the questions written back (see chunk_budget), so a document is
+# sent in as few calls as possible; QUIZ_CHUNK_MAX_TOKENS caps chunks lower.
+CONTEXT_TOKENS = int(os.getenv("QUIZ_CONTEXT_TOKENS", 16385))
+PROMPT_TOKENS = 250                 # the QCM prompt template without the document
+TOKENS_PER_QUESTION = 120           # one question with its four choices and answer
+CHUNK_MAX_TOKENS = int(os.getenv("QUIZ_CHUNK_MAX_TOKENS", CONTEXT_TOKENS - PROMPT_TOKENS))
+
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model("gpt-3.5-turbo")
+    except Exception:   # no network to download the encoding
+        return None
+
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4   # about four characters per token in English
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+
+@dataclass
+class Chunk:
+    text: str
+    tokens: int
+    pages: List[int] = field(default_factory=list)
+    num_questions: int = 0
+    cached: bool = False    # its questions came from the quiz cache
+
+
+
+def chunk_budget(num_questions: int, max_tokens: int = CHUNK_MAX_TOKENS) -> int:
+    return max(1, min(max_tokens, CONTEXT_TOKENS - PROMPT_TOKENS - TOKENS_PER_QUESTION * num_questions))
+
+
+
+# a page longer than the budget is cut into pieces at paragraph, then line, then word boundaries
+def _split_page(text: str, budget: int) -> List[str]:
+    if count_tokens(text) <= budget:
+        return [text]
+
+    for separator in ("\n\n", "\n", " "):
+        parts = text.split(separator)
+        if len(parts) > 1:
+            break
+    else:
+        # one unbroken run of characters
+        size = max(1, len(text) * budget // count_tokens(text))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    pieces, current = [], ""
+    for part in parts:
+        candidate = current + separator + part if current else part
+        if current and count_tokens(candidate) > budget:
+            pieces.extend(_split_page(current, budget))
+            current = part
+        else:
+            current = candidate
+    if current:
+        pieces.extend(_split_page(current, budget))
+    return pieces
+
+
+
+# consecutive pages packed greedily into chunks of at most `budget` tokens
+def pack_pages(pages: List[str], budget: int) -> List[Chunk]:
+    chunks = []
+    current = None
+    for page_num, page in enumerate(pages):
+        for piece in _split_page(page, budget):
+            tokens = count_tokens(piece)
+            if not piece.strip():
+                continue
+            if current is not None and current.tokens + tokens <= budget:
+                current.text += "\n\n" + piece
+                current.tokens += tokens
+                if current.pages[-1] != page_num:
+                    current.pages.append(page_num)
+            else:
+                current = Chunk(text=piece, tokens=tokens, pages=[page_num])
+                chunks.append(current)
+    return chunks
+
+
+
+# Largest-remainder split of `total` in proportion to `weights`, at least one
+# each (there are never more weights than `total`); all-zero weights split it evenly.
+def allocate(total: int, weights: List[int]) -> List[int]:
+    if not any(weights):
+        weights = [1] * len(weights)
+    spare = total - len(weights)
+    weight_sum = sum(weights)
+    quotas = [spare * weight / weight_sum for weight in weights]
+    shares = [int(quota) for quota in quotas]
+    by_remainder = sorted(range(len(weights)), key=lambda i: quotas[i] - shares[i], reverse=True)
+    for i in by_remainder[:spare - sum(shares)]:
+        shares[i] += 1
+    return [share + 1 for share in shares]
+
+
+
+# Plans the LLM calls for a document: its pages packed into chunks that fill
+# the context, each asked for its share of `num_questions` by size. There are
+# never more chunks than questions, so the number of calls and of tokens sent
+# grows with `num_questions` rather than with the page count. Only a document
+# longer than `num_questions` full contexts is sampled, by chunks spread
+# evenly across it.
+def plan_chunks(pages: List[str], num_questions: int, max_tokens: int = CHUNK_MAX_TOKENS) -> List[Chunk]:
+    if num_questions < 1:
+        return []
+    chunks = pack_pages(pages, chunk_budget(num_questions, max_tokens))
+    if len(chunks) > num_questions:
+        step = len(chunks) / num_questions
+        chunks = [chunks[int(i * step + step / 2)] for i in range(num_questions)]
+
+    for chunk, share in zip(chunks, allocate(num_questions, [chunk.tokens for chunk in chunks])):
+        chunk.num_questions = share
+    return chunks
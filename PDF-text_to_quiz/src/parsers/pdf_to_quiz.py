@@ -1,71 +1,129 @@
-import asyncio
+import math
 import os
+import asyncio
 from langchain_community.document_loaders import PyPDFLoader
 from src.generators.quiz_generator import generate_quizz
+from src.generators.quiz_collector import stream_questions
+from src.parsers.chunk_planner import plan_chunks
 from src.utils.ui_utils import transform
+from src.utils import quiz_cache
 import traceback
 
 
+# extra questions planned on top of the ones asked for, to make up for answers
+# that fail to parse or repeat a question; the calls left over once enough
+# questions came back are cancelled
+SPARE_QUESTIONS = float(os.getenv("QUIZ_SPARE_QUESTIONS", 0.25))
+
+
+
+# a chunk whose text was already sent for at least as many questions is served from the cache
+async def generate_chunk_questions(chunk):
+    key = quiz_cache.cache_key(chunk.text)
+    cached = await asyncio.to_thread(quiz_cache.get, "chunks", key) or []
+    if len(cached) >= chunk.num_questions:
+        chunk.cached = True
+        return cached[:chunk.num_questions]
+
+    result = await generate_quizz(chunk.text, chunk.num_questions)
+    if not result or not isinstance(result, list) or not result[0]:
+        return []
+    questions = transform(result[0], chunk.num_questions)
+    if len(questions) > len(cached):
+        await asyncio.to_thread(quiz_cache.put, "chunks", key, questions)
+    return questions
+
+
+
+def plan_quizz(page_texts, num_questions: int):
+    planned = num_questions + math.ceil(num_questions * SPARE_QUESTIONS)
+    chunks = plan_chunks(page_texts, planned)
+    print(f"Planned {len(chunks)} chunks: " + ", ".join(
+        f"pages {chunk.pages[0]+1}-{chunk.pages[-1]+1} ({chunk.tokens} tokens, {chunk.num_questions} questions)"
+        for chunk in chunks))
+    return chunks, planned
+
+
+
+# Yields ("question", question) as soon as each chunk's answer is parsed and
+# ("progress", {...}) after each chunk; the pages counted are those the
+# planned chunks cover. Counts for the response metadata go to `meta`.
+async def stream_chunk_quizz(chunks, num_questions: int, meta: dict):
+    pages_total = len({page for chunk in chunks for page in chunk.pages})
+    chunks_done, pages_done = 0, set()
+    meta["chunks_cached"] = 0
+    async for event, data in stream_questions(chunks, generate_chunk_questions, num_questions, meta):
+        if event == "question":
+            yield event, data
+        else:
+            chunks_done += 1
+            meta["chunks_cached"] += data.cached
+            pages_done.update(data.pages)
+            yield "progress", {"chunks_done": chunks_done, "chunks_total": len(chunks),
+                               "pages_done": len(pages_done), "pages_total": pages_total}
+
 
-async def pdf_to_quizz(pdf_file_name, num_questions: int = 5):
-    try:
-        if not os.path.exists(pdf_file_name):
-            raise FileNotFoundError(f"PDF file not found: {pdf_file_name}")
-            
-        print(f"Processing PDF: {pdf_file_name}, generating {num_questions} questions")
-        
-        # Load PDF and split pages
-        loader = PyPDFLoader(pdf_file_name)
-        pages = loader.load_and_split()
-        
-        if not pages:
-            print("No pages were extracted from the PDF")
-            return []
-            
-        print(f"Extracted {len(pages)} pages from PDF")
-
-        sem = asyncio.Semaphore(10)  
-
-        async def process_page(page, page_num):
-            async with sem:
-                try:
-                    print(f"Processing page {page_num+1}")
-                    result = await generate_quizz(page.page_content, num_questions)
-                    return result if result else [] 
-                except Exception as e:
-                    print(f"Error processing page {page_num+1}: {str(e)}")
-                    return []
-
-        tasks = [process_page(page, i) for i, page in enumerate(pages)]
-        questions = await asyncio.gather(*tasks)
-
-        all_questions = []
-        for i, question_set in enumerate(questions):
-            if question_set: 
-                try:
-                    print(f"Transforming question set from page {i+1}, containing {len(question_set)} items")
-                    
-                    if isinstance(question_set, list) and len(question_set) > 0:
-                        transformed_questions = transform(question_set[0], num_questions)
-                        print(f"Transformed to {len(transformed_questions)} questions")
-                        all_questions.extend(transformed_questions)
-                    else:
-                        print(f"Skipping empty question set from page {i+1}")
-                except Exception as e:
-                    print(f"Error transforming questions from page {i+1}: {str(e)}")
-                    traceback.print_exc()
-
-        print(f"Total questions generated: {len(all_questions)}")
-        
-        if len(all_questions) > num_questions:
-            all_questions = all_questions[:num_questions]
-            print(f"Limited to {num_questions} questions as requested")
-            
-        return all_questions
 
+async def stream_pdf_quizz(pdf_file_name, num_questions: int, meta: dict):
+    if not os.path.exists(pdf_file_name):
+        raise FileNotFoundError(f"PDF file not found: {pdf_file_name}")
 
+    print(f"Processing PDF: {pdf_file_name}, generating {num_questions} questions")
+
+    # the same file, asked for at least as many questions before
+    document_key = await asyncio.to_thread(quiz_cache.file_key, pdf_file_name)
+    cached = await asyncio.to_thread(quiz_cache.get, "documents", document_key) or []
+    if len(cached) >= num_questions:
+        print(f"Serving {num_questions} questions from the quiz cache")
+        meta.update({"cached": True, "questions_generated": num_questions, "questions_returned": num_questions})
+        for question in cached[:num_questions]:
+            yield "question", question
+        return
+
+    # Load PDF pages and pack them into token-budgeted chunks, each asked
+    # for its share of the questions
+    loader = PyPDFLoader(pdf_file_name)
+    pages = loader.load()
+
+    if not pages:
+        print("No pages were extracted from the PDF")
+        return
+
+    print(f"Extracted {len(pages)} pages from PDF")
+    chunks, planned = plan_quizz([page.page_content for page in pages], num_questions)
+    meta.update({"pages": len(pages), "questions_planned": planned})
+
+    # questions are taken as each chunk finishes; the rest is cancelled once there are enough
+    questions = []
+    async for event, data in stream_chunk_quizz(chunks, num_questions, meta):
+        if event == "question":
+            questions.append(data)
+        yield event, data
+
+    print(f"Returning {meta['questions_returned']} of {meta['questions_generated']} questions generated; "
+          f"{meta['llm_calls_completed']} calls completed ({meta['chunks_cached']} from the cache), "
+          f"{meta['llm_calls_cancelled']} cancelled, {meta['llm_calls_saved']} never sent")
+    meta["cached"] = False
+    if len(questions) > len(cached):
+        await asyncio.to_thread(quiz_cache.put, "documents", document_key, questions)
+
+
+
+async def pdf_to_quizz_with_meta(pdf_file_name, num_questions: int = 5):
+    all_questions, meta = [], {}
+    try:
+        async for event, data in stream_pdf_quizz(pdf_file_name, num_questions, meta):
+            if event == "question":
+                all_questions.append(data)
+        return all_questions, meta
 
     except Exception as e:
         print(f"Error processing PDF: {str(e)}")
         traceback.print_exc()
-        return []
\ No newline at end of file
+        return [], meta
+
+
+
+async def pdf_to_quizz(pdf_file_name, num_questions: int = 5):
+    questions, _ = await pdf_to_quizz_with_meta(pdf_file_name, num_questions)
+    return questions
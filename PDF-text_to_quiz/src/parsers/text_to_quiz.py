@@ -19,4 +19,23 @@ async def txt_to_quizz(content, num_questions):
 
         return transformed_quizz
 
-    return ''
\ No newline at end of file
+    return ''
+
+
+# the text planned like the pages of a PDF, so a long text is split across calls
+async def stream_text_quizz(content: str, num_questions: int, meta: dict):
+    from src.parsers.pdf_to_quiz import plan_quizz, stream_chunk_quizz
+    chunks, planned = plan_quizz([content], num_questions)
+    meta.update({"questions_planned": planned})
+    async for event, data in stream_chunk_quizz(chunks, num_questions, meta):
+        yield event, data
+
+
+
+# the same, all at once: returns (questions, metadata); repeated texts are served from the quiz cache
+async def text_to_quizz_with_meta(content: str, num_questions: int):
+    questions, meta = [], {}
+    async for event, data in stream_text_quizz(content, num_questions, meta):
+        if event == "question":
+            questions.append(data)
+    return questions, meta
@@ -0,0 +1,39 @@
+import threading
+from collections import deque, defaultdict
+
+
+# latest samples kept per metric
+WINDOW = 1000
+
+_samples = defaultdict(lambda: deque(maxlen=WINDOW))
+_counts = defaultdict(int)
+_lock = threading.Lock()
+
+
+
+def observe(name: str, seconds: float):
+    with _lock:
+        _samples[name].append(seconds)
+        _counts[name] += 1
+
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+
+# {name: {"count", "p50_ms", "p95_ms", "max_ms"}} over the latest samples
+def summary():
+    with _lock:
+        samples = {name: sorted(values) for name, values in _samples.items()}
+        counts = dict(_counts)
+    return {
+        name: {
+            "count": counts[name],
+            "p50_ms": round(1000 * _percentile(values, 50), 1),
+            "p95_ms": round(1000 * _percentile(values, 95), 1),
+            "max_ms": round(1000 * values[-1], 1),
+        }
+        for name, values in samples.items() if values
+    }
@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import List, Optional
+from src.llm.qcm_chain import template, generate_regex_and_output_keys
+
+
+# Content-addressed disk cache of parsed questions. An entry is keyed on the
+# hash of what was sent (the PDF bytes, or the text of one chunk) and the
+# prompt version, and holds every question generated for it; callers take as
+# many as they need. A re-uploaded document is served from disk and a partly
+# changed one only regenerates the chunks whose text changed, whatever share
+# of the questions each chunk is given this time. Entries are JSON files, and
+# the least recently used ones are evicted (by mtime, touched on every hit)
+# once the cache outgrows its size. These functions do blocking file I/O:
+# async code runs them with asyncio.to_thread.
+CACHE_DIR = os.getenv("QUIZ_CACHE_DIR", os.path.join(tempfile.gettempdir(), "quiz_cache"))
+CACHE_MAX_BYTES = int(os.getenv("QUIZ_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+CACHE_ENABLED = os.getenv("QUIZ_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# bump when transform changes the shape of the questions it returns
+FORMAT_VERSION = 1
+
+# evicts down to this share of the maximum, so a full cache is not rescanned on every write
+EVICT_TO = 0.9
+
+PROMPT_VERSION = hashlib.sha256(
+    f"{FORMAT_VERSION}\n{template}\n{generate_regex_and_output_keys(1)[0]}".encode("utf-8")
+).hexdigest()[:16]
+
+_size = None    # bytes on disk, counted on the first write
+_lock = threading.Lock()
+
+
+
+def cache_key(content) -> str:
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    digest = hashlib.sha256(content)
+    digest.update(f"\0{PROMPT_VERSION}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+
+def file_key(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return cache_key(digest.digest())
+
+
+
+def _path(kind: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, kind, key[:2], key + ".json")
+
+
+
+def get(kind: str, key: str) -> Optional[List[dict]]:
+    if not CACHE_ENABLED:
+        return None
+    path = _path(kind, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+        os.utime(path)      # most recently used
+        return questions
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Unreadable quiz cache entry {path}: {str(e)}")
+        return None
+
+
+
+def put(kind: str, key: str, questions: List[dict]):
+    global _size
+    if not CACHE_ENABLED or not questions:
+        return
+    path = _path(kind, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(questions).encode("utf-8")
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        # written aside and renamed, so a reader never sees half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write quiz cache entry {path}: {str(e)}")
+        return
+
+    with _lock:
+        if _size is None:
+            _size = _disk_usage()
+        else:
+            _size += len(data) - replaced
+        if _size > CACHE_MAX_BYTES:
+            _size = _evict(int(CACHE_MAX_BYTES * EVICT_TO))
+
+
+
+def _entries():
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:   # evicted by another worker
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+
+
+def _disk_usage() -> int:
+    return sum(size for _, size, _ in _entries())
+
+
+
+# removes the least recently used entries until at most `target` bytes remain
+def _evict(target: int) -> int:
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.unlink(path)
+            evicted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    print(f"Quiz cache: evicted {evicted} entries, {total} bytes left")
+    return total
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# scripts that call a running server at $IP_ADDRESS, run by hand
+collect_ignore = ["test_api_pdf.py", "test_api_text.py"]
@@ -0,0 +1,78 @@
+import pytest
+from src.parsers.chunk_planner import allocate, plan_chunks, count_tokens, chunk_budget, CONTEXT_TOKENS, PROMPT_TOKENS, TOKENS_PER_QUESTION
+
+
+
+@pytest.mark.parametrize("total,weights", [
+    (10, [1, 1, 1]),
+    (7, [100, 10, 1]),
+    (5, [0, 0]),
+    (3, [5, 5, 5]),
+    (25, [3000, 2900, 120, 40]),
+])
+def test_allocate_gives_everyone_at_least_one_and_adds_up(total, weights):
+    shares = allocate(total, weights)
+    assert sum(shares) == total
+    assert len(shares) == len(weights)
+    assert min(shares) >= 1
+
+
+
+def test_allocate_follows_the_weights():
+    assert allocate(10, [3, 1]) == [7, 3]
+    assert allocate(12, [1, 1, 1, 1]) == [3, 3, 3, 3]
+
+
+
+def page(i, words=400):
+    return " ".join(f"page{i}word{j}" for j in range(words))
+
+
+
+def test_small_pages_are_packed_together():
+    chunks = plan_chunks([page(i, 50) for i in range(6)], 10)
+    assert len(chunks) == 1
+    assert chunks[0].pages == list(range(6))
+    assert chunks[0].num_questions == 10
+
+
+
+def test_chunks_fit_the_budget_and_share_the_questions():
+    pages = [page(i) for i in range(30)]
+    chunks = plan_chunks(pages, 12, max_tokens=1500)
+    budget = chunk_budget(12, 1500)
+    assert all(chunk.tokens <= budget and count_tokens(chunk.text) <= budget for chunk in chunks)
+    assert sum(chunk.num_questions for chunk in chunks) == 12
+    assert [p for chunk in chunks for p in chunk.pages] == sorted({p for chunk in chunks for p in chunk.pages})
+
+
+
+def test_chunks_are_sized_to_the_context():
+    assert chunk_budget(5) == CONTEXT_TOKENS - PROMPT_TOKENS - 5 * TOKENS_PER_QUESTION
+    pages = [page(i) for i in range(40)]
+    chunks = plan_chunks(pages, 5)
+    # every page is sent, in fewer calls than questions
+    assert [p for chunk in chunks for p in chunk.pages] == list(range(40))
+    assert len(chunks) < 5
+
+
+
+def test_long_documents_are_sampled_with_one_chunk_per_question_at_most():
+    pages = [page(i) for i in range(100)]
+    chunks = plan_chunks(pages, 5, max_tokens=1000)
+    assert len(chunks) == 5
+    assert all(chunk.num_questions == 1 for chunk in chunks)
+    # spread across the document rather than its first pages
+    assert chunks[0].pages[0] > 0 and chunks[-1].pages[-1] > 80
+
+
+
+def test_a_page_over_the_budget_is_split():
+    chunks = plan_chunks([page(0, 3000)], 4, max_tokens=1000)
+    assert len(chunks) > 1
+    assert all(chunk.pages == [0] for chunk in chunks)
+
+
+
+def test_no_questions_no_chunks():
+    assert plan_chunks([page(0)], 0) == []
@@ -0,0 +1,18 @@
+import os
+import asyncio
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.llm.qa_llm import get_llm, get_http_clients, close_http_clients
+from src.generators.quiz_generator import get_chain
+
+
+
+def test_closing_the_clients_drops_the_models_and_chains_built_on_them():
+    llm, chain = get_llm(), get_chain(3)
+    asyncio.run(close_http_clients())
+
+    assert get_llm() is not llm
+    assert get_chain(3) is not chain
+    assert not any(client.is_closed for client in get_http_clients())
+    asyncio.run(close_http_clients())
@@ -0,0 +1,58 @@
+import os
+import time
+import pytest
+from src.utils import quiz_cache
+
+
+def question(i):
+    return {"question": f"question {i}", "A": "a", "B": "b", "C": "c", "D": "d", "reponse": "A"}
+
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(quiz_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(quiz_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(quiz_cache, "_size", None)
+    return tmp_path
+
+
+
+def test_keys_depend_on_the_content_only():
+    assert quiz_cache.cache_key("page text") == quiz_cache.cache_key(b"page text")
+    assert quiz_cache.cache_key("page text") != quiz_cache.cache_key("other text")
+
+
+
+def test_round_trip(cache_dir):
+    key = quiz_cache.cache_key("page text")
+    assert quiz_cache.get("chunks", key) is None
+    quiz_cache.put("chunks", key, [question(1), question(2)])
+    assert quiz_cache.get("chunks", key) == [question(1), question(2)]
+
+
+
+def test_overwriting_an_entry_keeps_the_size_exact(cache_dir):
+    key = quiz_cache.cache_key("page text")
+    for n in (1, 3, 3, 2):
+        quiz_cache.put("chunks", key, [question(i) for i in range(n)])
+    assert quiz_cache._size == quiz_cache._disk_usage()
+
+
+
+def test_evicts_the_least_recently_used(cache_dir, monkeypatch):
+    keys = [quiz_cache.cache_key(f"page {i}") for i in range(4)]
+    for i, key in enumerate(keys):
+        quiz_cache.put("chunks", key, [question(i)])
+    entry_size = quiz_cache._disk_usage() // 4
+
+    # the oldest entry is read again, so the second one is the least recently used
+    for i, key in enumerate(keys):
+        os.utime(quiz_cache._path("chunks", key), (time.time() - 100 + i, time.time() - 100 + i))
+    quiz_cache.get("chunks", keys[0])
+
+    monkeypatch.setattr(quiz_cache, "CACHE_MAX_BYTES", 4 * entry_size + 1)
+    quiz_cache.put("chunks", quiz_cache.cache_key("page 4"), [question(4)])
+    assert quiz_cache.get("chunks", keys[1]) is None
+    assert quiz_cache.get("chunks", keys[0]) is not None
+    assert quiz_cache._size <= quiz_cache.CACHE_MAX_BYTES
@@ -0,0 +1,64 @@
+import asyncio
+from src.generators.quiz_collector import stream_questions, collect_questions
+
+
+def question(text):
+    return {"question": text, "A": "a", "B": "b", "C": "c", "D": "d", "reponse": "B"}
+
+
+
+def test_questions_are_deduplicated_and_invalid_ones_dropped():
+    async def generate(job):
+        return [question(f"What is {job}?"), question(f"what is {job}"), {"question": "no choices"}]
+
+    questions, meta = asyncio.run(collect_questions(["cells", "atoms"], generate, 10))
+    assert sorted(q["question"] for q in questions) == ["What is atoms?", "What is cells?"]
+    assert meta["duplicates_dropped"] == 2
+    assert meta["invalid_dropped"] == 2
+    assert meta["llm_calls_completed"] == 2
+
+
+
+# 25 calls, 3 at a time: jobs 0-6 finish in order (jobs 2 and 5 fail) while
+# the rest are slow, so the quota of 10 is met after job 6
+def test_calls_are_cancelled_once_the_quota_is_met():
+    started = []
+
+    async def generate(job):
+        started.append(job)
+        if job >= 7:
+            await asyncio.sleep(10)
+        await asyncio.sleep(0.01 * job)
+        if job in (2, 5):
+            raise RuntimeError("bad response")
+        return [question(f"question {job}.{k}") for k in range(2)]
+
+    async def run():
+        events, meta = [], {}
+        async for event in stream_questions(list(range(25)), generate, 10, meta, concurrency=3):
+            events.append(event)
+        return events, meta
+
+    events, meta = asyncio.run(run())
+    questions = [data for event, data in events if event == "question"]
+    assert len(questions) == 10
+    assert [data for event, data in events if event == "progress"] == list(range(7))
+    assert meta["llm_calls_planned"] == 25
+    assert meta["llm_calls_completed"] == 5
+    assert meta["llm_calls_failed"] == 2
+    assert meta["llm_calls_completed"] + meta["llm_calls_failed"] + meta["llm_calls_cancelled"] \
+        + meta["llm_calls_saved"] == 25
+    # only the calls that were started are counted as cancelled
+    assert meta["llm_calls_cancelled"] == len(started) - 7
+    assert meta["questions_generated"] == meta["questions_returned"] == 10
+
+
+
+def test_questions_past_the_quota_are_generated_but_not_returned():
+    async def generate(job):
+        return [question(f"question {job}.{k}") for k in range(3)]
+
+    questions, meta = asyncio.run(collect_questions([0, 1], generate, 4, concurrency=1))
+    assert len(questions) == 4
+    assert meta["questions_returned"] == 4
+    assert meta["questions_generated"] == 6
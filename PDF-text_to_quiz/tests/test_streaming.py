@@ -0,0 +1,51 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import json
+import asyncio
+import pytest
+from starlette.requests import ClientDisconnect
+from fastapi.testclient import TestClient
+import main
+
+
+
+def test_the_upload_is_removed_after_the_stream(monkeypatch):
+    paths = []
+
+    async def stream_pdf_quizz(path, num_questions, meta):
+        paths.append(path)
+        assert os.path.exists(path)
+        yield "question", {"question": "q?", "A": "a", "B": "b", "C": "c", "D": "d", "reponse": "A"}
+
+    monkeypatch.setattr(main, "stream_pdf_quizz", stream_pdf_quizz)
+    response = TestClient(main.app).post("/pdf_to_quizz/stream?num_questions=1",
+                                         files={"file": ("notes.pdf", b"%PDF-1.4 fake", "application/pdf")})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["event"] for event in events] == ["question", "done"]
+    assert len(paths) == 1 and not os.path.exists(paths[0])
+
+
+
+def test_the_file_is_removed_when_the_client_is_gone_before_the_stream_starts(tmp_path):
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    started = []
+
+    async def events():
+        started.append(True)
+        yield "never sent\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    response = main.streaming_response(events(), cleanup_path=str(path))
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response(scope, receive, send))
+    assert not started
+    assert not path.exists()
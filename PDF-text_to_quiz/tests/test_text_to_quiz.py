@@ -0,0 +1,45 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest
+from fastapi.testclient import TestClient
+import main
+from src.parsers import pdf_to_quiz
+from src.utils import quiz_cache
+
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(quiz_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(quiz_cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(quiz_cache, "_size", None)
+    calls = []
+
+    # what the QCM chain parses out of one answer
+    async def generate_quizz(content, num_questions):
+        calls.append(num_questions)
+        item = {}
+        for i in range(1, num_questions + 1):
+            item.update({f"question{i}": f"{content[:20]} question {i}?", f"A_{i}": "a", f"B_{i}": "b",
+                         f"C_{i}": "c", f"D_{i}": "d", f"reponse{i}": "A"})
+        return [[item]]
+
+    monkeypatch.setattr(pdf_to_quiz, "generate_quizz", generate_quizz)
+    return calls
+
+
+
+def test_repeated_texts_are_served_from_the_quiz_cache(calls):
+    client = TestClient(main.app)
+    body = {"content": "Photosynthesis turns light into chemical energy. " * 20, "num_questions": 4}
+
+    first = client.post("/text_to_quizz/", json=body)
+    assert first.status_code == 200
+    assert len(first.json()) == 4
+    assert len(calls) == 1
+
+    again = client.post("/text_to_quizz/", json=body)
+    assert again.json() == first.json()
+    assert len(calls) == 1
@@ -1,9 +1,169 @@
-from flask import request, jsonify
-from services.llm_service import is_personal_query, generate_mongo_query, format_query_response, get_fallback_response
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Response, request, jsonify
+from services.llm_service import (generate_mongo_query, format_query_response, get_fallback_response,
+                                  stream_query_response, stream_fallback_response)
+from services.classifier_service import is_personal_query, rule_classify, classifier_stats
 from services.cache_service import find_similar_question, add_to_cache, get_exact_match
+from services.plan_cache import plans
+from services.result_cache import results_cache
+from services.singleflight import SingleFlight
+from services import metrics
 from services.query_service import parse_mongo_query, execute_mongo_query
-from utils import serialize_results, handle_exception
-from config import logger
+from utils import normalize_question, serialize_results, sse_event, handle_exception
+from config import SPECULATIVE_SIMILARITY, logger
+
+
+# runs the classifier and the semantic cache search side by side
+executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="ask")
+
+# one LLM call and one cache insert per fresh question in flight
+fresh_answers = SingleFlight("fresh answers")
+
+
+
+# Where the answer to a query comes from, as (source, answer, similarity):
+# a cache hit carries its answer, "personal" and "fresh_query" still need the LLM
+def route_query(query):
+    # exact match: only questions classified as non-personal are ever
+    # cached, so a hit is decisive and skips the classifier
+    exact_match = get_exact_match(query)
+    if exact_match:
+        return "cache_exact_match", exact_match, 1.0
+
+    # classify the query while the semantic cache is searched; a close
+    # similar hit answers before the classifier only when the rules lean
+    # general, so a personal question never gets a cached answer
+    speculate = rule_classify(query)[0] is False
+    personal = executor.submit(is_personal_query, query)
+    similar = executor.submit(find_similar_question, query)
+
+    similar_answer, score = None, 0
+    for future in as_completed([personal, similar]):
+        if future is similar:
+            similar_answer, score = similar.result()
+            if speculate and similar_answer and score >= SPECULATIVE_SIMILARITY:
+                # cancel() only drops a classification still queued; one that
+                # already started runs to the end in its thread
+                personal.cancel()
+                return "cache_similar_match", similar_answer, score
+        elif personal.result():
+            similar.cancel()
+            return "personal", None, 0
+
+    # similar question
+    if similar_answer:
+        return "cache_similar_match", similar_answer, score
+    return "fresh_query", None, 0
+
+
+
+# Plan and results for a personal query, as (pipeline, answer, serialized results);
+# the answer is set when nothing is left for the LLM to format
+def prepare_personal_query(query, email):
+    mongo_query = plans.get(query, email)
+    cached_plan = mongo_query is not None
+    if not cached_plan:
+        mongo_query_string = generate_mongo_query(query, email)
+        mongo_query = parse_mongo_query(mongo_query_string)
+
+    # the same student asking the same thing again, with no writes in between
+    answer = results_cache.get_answer(email, mongo_query, query)
+    if answer is not None:
+        return mongo_query, answer, None
+
+    serialized = results_cache.get_results(email, mongo_query)
+    if serialized is None:
+        generation = results_cache.generation(email)
+        results = execute_mongo_query(mongo_query)
+        if not results:
+            return mongo_query, "No personal records found.", None
+
+        # only plans that found something are shared with other students
+        if not cached_plan:
+            plans.put(query, email, mongo_query)
+
+        serialized = serialize_results(results)
+        results_cache.put_results(email, mongo_query, serialized, generation)
+
+    return mongo_query, None, serialized
+
+
+
+def answer_personal_query(query, email):
+    mongo_query, answer, serialized = prepare_personal_query(query, email)
+    if answer is None:
+        answer = format_query_response(query, serialized)
+        results_cache.put_answer(email, mongo_query, query, answer)
+    return jsonify({"answer": answer})
+
+
+
+
+def answer_fresh_query(query):
+    # a call for the same question may have finished just before this one started
+    cached = get_exact_match(query)
+    if cached:
+        return cached
+
+    final_answer = get_fallback_response(query)
+
+    # add a new question to cache
+    add_to_cache(query, final_answer)
+    return final_answer
+
+
+
+
+# Server-sent events for /ask/stream: "token" events as the answer is
+# generated, then "done" with the source and the timings
+def stream_answer(query, email, start):
+    first_token = None
+    try:
+        source, answer, score = route_query(query)
+
+        if answer is None:
+            if source == "personal":
+                mongo_query, answer, serialized = prepare_personal_query(query, email)
+
+            if answer is None:
+                tokens = (stream_query_response(query, serialized) if source == "personal"
+                          else stream_fallback_response(query))
+                parts = []
+                for token in tokens:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(token)
+                    yield sse_event("token", {"token": token})
+                answer = "".join(parts).strip()
+
+                # only a completed stream reaches the caches
+                if source == "personal":
+                    results_cache.put_answer(email, mongo_query, query, answer)
+                else:
+                    add_to_cache(query, answer)
+                answer = None
+
+        # cache hits and canned answers arrive in one piece
+        if answer is not None:
+            first_token = time.perf_counter()
+            yield sse_event("token", {"token": answer})
+
+        done = time.perf_counter()
+        ttft_ms = round((first_token - start) * 1000, 1) if first_token else None
+        total_ms = round((done - start) * 1000, 1)
+        logger.info(f"Streamed {source} answer: first token after {ttft_ms} ms, done after {total_ms} ms")
+        metrics.inc("edubot_answers_total", source=source)
+        if first_token:
+            metrics.observe("stream.first_token", first_token - start)
+        metrics.observe("stream.total", done - start)
+        event = {"source": source, "ttft_ms": ttft_ms, "total_ms": total_ms}
+        if source == "cache_similar_match":
+            event["similarity"] = score
+        yield sse_event("done", event)
+
+    except Exception as e:
+        yield sse_event("error", {"error": handle_exception(e)})
 
 
 
@@ -17,7 +177,22 @@ def register_routes(app):
     
 
 
+    @app.route("/classifier/stats", methods=["GET"])
+
+    def classifier_statistics():
+        return jsonify(classifier_stats())
+
+
+
+    @app.route("/metrics", methods=["GET"])
+
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+
     @app.route("/ask", methods=["POST"])
+    @metrics.timed("request.ask")
 
     def ask():
         try:
@@ -27,35 +202,35 @@ def register_routes(app):
             if not query or not email:
                 return jsonify({"error": "Query and email are required"}), 400
     
-            # is the query personal?
-            if is_personal_query(query):
-                mongo_query_string = generate_mongo_query(query, email)
-                mongo_query = parse_mongo_query(mongo_query_string)
-                results = execute_mongo_query(mongo_query)
-    
-                if not results:
-                    return jsonify({"answer": "No personal records found."})
-    
-                response = format_query_response(query, serialize_results(results))
-                return jsonify({"answer": response})
-    
-            # exact match
-            exact_match = get_exact_match(query)
-            if exact_match:
-                return jsonify({"answer": exact_match, "source": "cache_exact_match"})
-    
-            # similar question
-            similar_answer, score = find_similar_question(query)
-            if similar_answer:
-                return jsonify({"answer": similar_answer, "source": "cache_similar_match", "similarity": score})
-    
-            final_answer = get_fallback_response(query)
-            
-            # add a new question to cache
-            add_to_cache(query, final_answer)
+            source, answer, score = route_query(query)
+            metrics.inc("edubot_answers_total", source=source)
+            if source == "cache_exact_match":
+                return jsonify({"answer": answer, "source": source})
+            if source == "cache_similar_match":
+                return jsonify({"answer": answer, "source": source, "similarity": score})
+            if source == "personal":
+                return answer_personal_query(query, email)
+
+            # students asking the same fresh question at once share one LLM call
+            final_answer = fresh_answers.do(normalize_question(query), lambda: answer_fresh_query(query))
             return jsonify({"answer": final_answer, "source": "fresh_query"})
     
     
         except Exception as e:
             error_message = handle_exception(e)
-            return jsonify({"error": error_message}), 500
\ No newline at end of file
+            return jsonify({"error": error_message}), 500
+
+
+
+    @app.route("/ask/stream", methods=["POST"])
+
+    def ask_stream():
+        start = time.perf_counter()
+        data = request.json or {}
+        query, email = data.get("query"), data.get("email")
+
+        if not query or not email:
+            return jsonify({"error": "Query and email are required"}), 400
+
+        return Response(stream_answer(query, email, start), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -2,6 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from config import PORT, logger
 from api_routes import register_routes
+from startup import start_warm_up
 
 
 
@@ -18,6 +19,9 @@ def create_app():
     
     logger.info("Flask app initialized with CORS")
     
+    # indexes, models and the answer cache are set up off the startup path
+    start_warm_up()
+    
     register_routes(app)
     
     return app
@@ -0,0 +1,45 @@
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from config import PORT, logger
+from async_routes import register_async_routes
+from startup import start_warm_up
+
+
+
+# asyncio-native counterpart of app.create_app(): one process keeps hundreds
+# of /ask requests in flight while they wait on OpenAI and MongoDB
+def create_asgi_app():
+    app = FastAPI()
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "*",
+            "http://localhost:8081",
+            "https://edu-frontend-1.onrender.com"
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    logger.info("ASGI app initialized with CORS")
+    
+    # indexes, models and the answer cache are set up off the startup path
+    start_warm_up()
+    
+    register_async_routes(app)
+    
+    return app
+
+
+
+app = create_asgi_app()
+
+
+
+
+if __name__ == "__main__":
+    import uvicorn
+    logger.info(f"Starting ASGI server on port {PORT}")
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,250 @@
+import time
+import asyncio
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse, Response
+from services.llm_service import (agenerate_mongo_query, aformat_query_response, aget_fallback_response,
+                                  astream_query_response, astream_fallback_response)
+from services.classifier_service import ais_personal_query, rule_classify, classifier_stats
+from services.cache_service import afind_similar_question, aadd_to_cache, aget_exact_match
+from services.plan_cache import plans
+from services.result_cache import results_cache
+from services.singleflight import SingleFlight
+from services import metrics
+from services.query_service import parse_mongo_query, aexecute_mongo_query
+from utils import normalize_question, serialize_results, sse_event, handle_exception
+from config import SPECULATIVE_SIMILARITY, logger
+
+
+# one LLM call and one cache insert per fresh question in flight
+fresh_answers = SingleFlight("fresh answers")
+
+
+
+
+# same as api_routes.route_query: (source, answer, similarity)
+async def aroute_query(query):
+    # exact match: only questions classified as non-personal are ever
+    # cached, so a hit is decisive and skips the classifier
+    exact_match = await aget_exact_match(query)
+    if exact_match:
+        return "cache_exact_match", exact_match, 1.0
+
+    # classify the query while it is embedded and the semantic cache searched;
+    # whichever settles the answer first cancels the other, which abandons
+    # its embedding or LLM request. A close similar hit only goes first when
+    # the rules lean general, so a personal question never gets a cached answer
+    speculate = rule_classify(query)[0] is False
+    personal = asyncio.create_task(ais_personal_query(query))
+    similar = asyncio.create_task(afind_similar_question(query))
+
+    similar_answer, score = None, 0
+    try:
+        for future in asyncio.as_completed([personal, similar]):
+            await future
+            if similar.done() and not similar_answer:
+                similar_answer, score = similar.result()
+                if speculate and similar_answer and score >= SPECULATIVE_SIMILARITY:
+                    return "cache_similar_match", similar_answer, score
+            if personal.done() and personal.result():
+                return "personal", None, 0
+    finally:
+        personal.cancel()
+        similar.cancel()
+
+    # similar question
+    if similar_answer:
+        return "cache_similar_match", similar_answer, score
+    return "fresh_query", None, 0
+
+
+
+# same as api_routes.prepare_personal_query: (pipeline, answer, serialized results)
+async def aprepare_personal_query(query, email):
+    mongo_query = plans.get(query, email)
+    cached_plan = mongo_query is not None
+    if not cached_plan:
+        mongo_query_string = await agenerate_mongo_query(query, email)
+        mongo_query = parse_mongo_query(mongo_query_string)
+
+    # the same student asking the same thing again, with no writes in between
+    answer = results_cache.get_answer(email, mongo_query, query)
+    if answer is not None:
+        return mongo_query, answer, None
+
+    serialized = results_cache.get_results(email, mongo_query)
+    if serialized is None:
+        generation = results_cache.generation(email)
+        results = await aexecute_mongo_query(mongo_query)
+        if not results:
+            return mongo_query, "No personal records found.", None
+
+        # only plans that found something are shared with other students
+        if not cached_plan:
+            await asyncio.to_thread(plans.put, query, email, mongo_query)
+
+        serialized = serialize_results(results)
+        results_cache.put_results(email, mongo_query, serialized, generation)
+
+    return mongo_query, None, serialized
+
+
+
+async def aanswer_personal_query(query, email):
+    mongo_query, answer, serialized = await aprepare_personal_query(query, email)
+    if answer is None:
+        answer = await aformat_query_response(query, serialized)
+        results_cache.put_answer(email, mongo_query, query, answer)
+    return JSONResponse({"answer": answer})
+
+
+
+
+async def aanswer_fresh_query(query):
+    # a call for the same question may have finished just before this one started
+    cached = await aget_exact_match(query)
+    if cached:
+        return cached
+
+    final_answer = await aget_fallback_response(query)
+
+    # add a new question to cache
+    await aadd_to_cache(query, final_answer)
+    return final_answer
+
+
+
+
+# same events as api_routes.stream_answer
+async def astream_answer(query, email, start):
+    first_token = None
+    try:
+        source, answer, score = await aroute_query(query)
+
+        if answer is None:
+            if source == "personal":
+                mongo_query, answer, serialized = await aprepare_personal_query(query, email)
+
+            if answer is None:
+                tokens = (astream_query_response(query, serialized) if source == "personal"
+                          else astream_fallback_response(query))
+                parts = []
+                async for token in tokens:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(token)
+                    yield sse_event("token", {"token": token})
+                answer = "".join(parts).strip()
+
+                # only a completed stream reaches the caches
+                if source == "personal":
+                    results_cache.put_answer(email, mongo_query, query, answer)
+                else:
+                    await aadd_to_cache(query, answer)
+                answer = None
+
+        # cache hits and canned answers arrive in one piece
+        if answer is not None:
+            first_token = time.perf_counter()
+            yield sse_event("token", {"token": answer})
+
+        done = time.perf_counter()
+        ttft_ms = round((first_token - start) * 1000, 1) if first_token else None
+        total_ms = round((done - start) * 1000, 1)
+        logger.info(f"Streamed {source} answer: first token after {ttft_ms} ms, done after {total_ms} ms")
+        metrics.inc("edubot_answers_total", source=source)
+        if first_token:
+            metrics.observe("stream.first_token", first_token - start)
+        metrics.observe("stream.total", done - start)
+        event = {"source": source, "ttft_ms": ttft_ms, "total_ms": total_ms}
+        if source == "cache_similar_match":
+            event["similarity"] = score
+        yield sse_event("done", event)
+
+    except Exception as e:
+        yield sse_event("error", {"error": handle_exception(e)})
+
+
+
+
+# the JSON object in the request body, or None when it is malformed
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+
+
+# same routes as api_routes.register_routes, served from one event loop
+def register_async_routes(app):
+
+    @app.get("/")
+
+    async def home():
+        return PlainTextResponse("Async chatbot backend is running!")
+
+
+
+    @app.get("/classifier/stats")
+
+    async def classifier_statistics():
+        return JSONResponse(classifier_stats())
+
+
+
+    @app.get("/metrics")
+
+    async def prometheus_metrics():
+        return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+
+    @app.post("/ask")
+    @metrics.timed("request.ask")
+
+    async def ask(request: Request):
+        try:
+            data = await read_json(request)
+            if data is None:
+                return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+            query, email = data.get("query"), data.get("email")
+
+            if not query or not email:
+                return JSONResponse({"error": "Query and email are required"}, status_code=400)
+
+            source, answer, score = await aroute_query(query)
+            metrics.inc("edubot_answers_total", source=source)
+            if source == "cache_exact_match":
+                return JSONResponse({"answer": answer, "source": source})
+            if source == "cache_similar_match":
+                return JSONResponse({"answer": answer, "source": source, "similarity": score})
+            if source == "personal":
+                return await aanswer_personal_query(query, email)
+
+            # students asking the same fresh question at once share one LLM call
+            final_answer = await fresh_answers.ado(normalize_question(query), lambda: aanswer_fresh_query(query))
+            return JSONResponse({"answer": final_answer, "source": "fresh_query"})
+
+
+        except Exception as e:
+            error_message = handle_exception(e)
+            return JSONResponse({"error": error_message}, status_code=500)
+
+
+
+    @app.post("/ask/stream")
+
+    async def ask_stream(request: Request):
+        start = time.perf_counter()
+        data = await read_json(request)
+        if data is None:
+            return JSONResponse({"error": "Request body must be a JSON object"}, status_code=400)
+        query, email = data.get("query"), data.get("email")
+
+        if not query or not email:
+            return JSONResponse({"error": "Query and email are required"}, status_code=400)
+
+        return StreamingResponse(astream_answer(query, email, start), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,47 @@
+# recall and latency of the IVF index against exact search on synthetic,
+# clustered embeddings (questions tend to cluster around course topics)
+#
+#   python benchmarks/ann_benchmark.py --sizes 20000 100000 --dim 1536
+
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.vector_index import VectorIndex, evaluate_index, normalize
+
+
+
+def clustered_embeddings(n, dim, topics, rng):
+    centers = normalize(rng.standard_normal((topics, dim)))
+    labels = rng.integers(0, topics, n)
+    return normalize(centers[labels] + 0.6 * normalize(rng.standard_normal((n, dim))))
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        data = clustered_embeddings(size + args.queries, args.dim, args.topics, rng)
+        index = VectorIndex(ann_min_size=0) if args.nprobe is None else VectorIndex(ann_min_size=0, nprobe=args.nprobe)
+        index.rebuild(data[:size])
+
+        report = evaluate_index(index, data[size:], k=args.k)
+        print(f"n={report['size']:>8}  recall@{args.k}={report['recall_at_k']:.3f}  "
+              f"exact={report['exact_ms']:.2f}ms  ivf={report['ann_ms']:.2f}ms")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+# Offline benchmark of the full /ask path: create_app() driven through the
+# Flask test client, with deterministic fake OpenAI models and mongomock
+# instead of the network. For each cache size it reports the latency of
+# find_similar_question and add_to_cache, /ask throughput and percentiles,
+# and memory.
+#
+#   python benchmarks/edubot_benchmark.py --sizes 1000 10000 100000
+#   python benchmarks/edubot_benchmark.py --sizes 1000 1000000 --dim 128 --llm-latency-ms 300
+#   python benchmarks/edubot_benchmark.py --check --baseline benchmarks/baseline.json   # in CI
+#
+# --check exits with status 1 when a stage's median latency grows more than
+# --max-growth times from the smallest to the largest size, or is more than
+# --tolerance times slower than the --baseline results saved with --save.
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# the services read their settings at import time
+WORKDIR = tempfile.mkdtemp(prefix="edubot-benchmark-")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CACHE_DIR"] = os.path.join(WORKDIR, "cache")
+os.environ["EMBEDDING_MEMO_FILE"] = ""
+os.environ["RESULT_CACHE_WATCH"] = "0"
+os.environ.setdefault("CACHE_FSYNC", "0")
+os.environ.setdefault("EMBED_BATCH_WINDOW_MS", "0")
+os.environ.setdefault("CACHE_MAX_ENTRIES", str(10 ** 8))
+os.environ.setdefault("CACHE_MAX_BYTES", str(10 ** 12))
+os.makedirs(os.path.join(os.getcwd(), "logs"), exist_ok=True)
+
+import numpy as np
+
+
+
+STAGES = ["similar_search", "add_to_cache", "ask"]
+
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    return {f"p{p}": 1000 * values[min(len(values) - 1, int(p / 100 * len(values)))] for p in (50, 95, 99)}
+
+
+
+def words(rng, n):
+    return " ".join(f"w{rng.randrange(10 ** 9):x}" for _ in range(n))
+
+
+
+def fill_cache(cache_service, size, dim, batch=50000):
+    from ann_benchmark import clustered_embeddings
+    rng = np.random.default_rng(len(cache_service.store.questions))
+    missing = size - len(cache_service.store)
+    while missing > 0:
+        count = min(batch, missing)
+        start = len(cache_service.store.questions)
+        vectors = clustered_embeddings(count, dim, 500, rng)
+        cache_service.bulk_add_to_cache([(f"synthetic question {start + i}", f"synthetic answer {start + i}", vectors[i])
+                                         for i in range(count)])
+        missing -= count
+
+
+
+# latency of the cache operations alone: query embeddings are computed (and
+# memoized) up front so only the index and the store are timed
+def time_cache(cache_service, embedding_service, rng, samples):
+    queries = [f"what is {words(rng, 3)}" for _ in range(samples)]
+    for query in queries:
+        embedding_service.embed_query(query)
+
+    similar = []
+    for query in queries:
+        start = time.perf_counter()
+        cache_service.find_similar_question(query)
+        similar.append(time.perf_counter() - start)
+
+    added = []
+    for query in queries:
+        embedding = embedding_service.embed_query(query)
+        start = time.perf_counter()
+        cache_service.add_to_cache(query, f"answer to {query}", embedding)
+        added.append(time.perf_counter() - start)
+
+    return percentiles(similar), percentiles(added)
+
+
+
+# a mix of new, repeated, rephrased and personal questions
+def ask_workload(rng, requests):
+    fresh, workload = [], []
+    for _ in range(requests):
+        roll = rng.random()
+        if roll < 0.15:
+            workload.append(rng.choice(["what is my gpa", "show my attendance", "what are my marks in quiz 3"]))
+        elif fresh and roll < 0.45:
+            workload.append(rng.choice(fresh))
+        elif fresh and roll < 0.6:
+            workload.append(rng.choice(fresh) + " please")
+        else:
+            fresh.append(f"what is {words(rng, 3)}")
+            workload.append(fresh[-1])
+    return workload
+
+
+
+def run_ask(app, workload, concurrency, email):
+    def one(query):
+        start = time.perf_counter()
+        response = app.test_client().post("/ask", json={"query": query, "email": email})
+        body = response.get_json() or {}
+        return time.perf_counter() - start, response.status_code, body.get("source", "personal")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, workload))
+    elapsed = time.perf_counter() - start
+
+    sources = {}
+    for _, status, source in results:
+        key = source if status == 200 else f"error_{status}"
+        sources[key] = sources.get(key, 0) + 1
+    return {"throughput_rps": len(results) / elapsed, "sources": sources,
+            **percentiles([latency for latency, _, _ in results])}
+
+
+
+def check(results, baseline, max_growth, tolerance):
+    failures = []
+    smallest, largest = results[0], results[-1]
+    if largest["size"] > smallest["size"]:
+        for stage in ("similar_search", "add_to_cache"):
+            growth = largest[stage]["p50"] / max(smallest[stage]["p50"], 1e-6)
+            if growth > max_growth:
+                failures.append(f"{stage}: median grew {growth:.1f}x from {smallest['size']} to {largest['size']} entries")
+
+    previous = {entry["size"]: entry for entry in baseline or []}
+    for entry in results:
+        if entry["size"] not in previous:
+            continue
+        for stage in STAGES:
+            before, now = previous[entry["size"]][stage]["p50"], entry[stage]["p50"]
+            if now > tolerance * before:
+                failures.append(f"{stage} at {entry['size']} entries: median {now:.3f}ms vs {before:.3f}ms in the baseline")
+    return failures
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=256, help="dimension of the fake embeddings")
+    parser.add_argument("--samples", type=int, default=200, help="timed calls per cache operation and size")
+    parser.add_argument("--requests", type=int, default=500, help="/ask requests per size")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=0)
+    parser.add_argument("--embed-latency-ms", type=float, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peaks (slower)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file written by an earlier --save")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 on a scaling regression")
+    parser.add_argument("--max-growth", type=float, default=20)
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    import db
+    from services import llm_service
+    from fakes import FakeChatModel, FakeEmbeddings, fake_mongo_client, BENCHMARK_EMAIL
+
+    llm_service.configure_models(FakeChatModel(latency=args.llm_latency_ms / 1000),
+                                 FakeEmbeddings(dim=args.dim, latency=args.embed_latency_ms / 1000))
+    db.init_db(fake_mongo_client(), "benchmark")
+
+    from services import cache_service, embedding_service
+    from app import create_app
+    app = create_app()
+
+    rng = random.Random(0)
+    results = []
+    print(f"{'size':>9} | {'similar p50/p95/p99 ms':>24} | {'add p50/p95/p99 ms':>24} | "
+          f"{'ask rps':>8} | {'ask p50/p95/p99 ms':>24} | {'rss MB':>7}")
+
+    for size in sorted(args.sizes):
+        if args.trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        fill_cache(cache_service, size, args.dim)
+        fill_seconds = time.perf_counter() - start
+
+        similar, added = time_cache(cache_service, embedding_service, rng, args.samples)
+        ask = run_ask(app, ask_workload(rng, args.requests), args.concurrency, BENCHMARK_EMAIL)
+
+        entry = {"size": size, "fill_seconds": fill_seconds, "similar_search": similar, "add_to_cache": added, "ask": ask,
+                 "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        if args.trace_memory:
+            entry["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        results.append(entry)
+
+        fmt = lambda p: f"{p['p50']:7.3f} {p['p95']:7.3f} {p['p99']:8.3f}"
+        print(f"{size:>9} | {fmt(similar)} | {fmt(added)} | {ask['throughput_rps']:8.1f} | {fmt(ask)} | {entry['rss_mb']:7.0f}")
+
+    print("sources:", json.dumps(results[-1]["ask"]["sources"]))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        failures = check(results, baseline, args.max_growth, args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        sys.exit(1 if failures else 0)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Serves the Flask or the ASGI app with the fakes from fakes.py instead of
+# OpenAI and MongoDB, so load_test.py can compare the two offline:
+#
+#   python benchmarks/fake_server.py flask --port 5000 --llm-latency-ms 300
+#   python benchmarks/fake_server.py asgi --port 5001 --llm-latency-ms 300
+
+import os
+import sys
+import logging
+import argparse
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# the services read their settings at import time
+WORKDIR = tempfile.mkdtemp(prefix="edubot-fake-server-")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CACHE_DIR"] = os.path.join(WORKDIR, "cache")
+os.environ["EMBEDDING_MEMO_FILE"] = ""
+os.environ["RESULT_CACHE_WATCH"] = "0"
+os.environ["MONGO_ENSURE_INDEXES"] = "0"
+os.makedirs(os.path.join(os.getcwd(), "logs"), exist_ok=True)
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("app", choices=["flask", "asgi"])
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    import db
+    from services import llm_service
+    from fakes import FakeChatModel, FakeEmbeddings, FakeAsyncMongoClient, fake_mongo_client
+
+    llm_service.configure_models(FakeChatModel(latency=args.llm_latency_ms / 1000),
+                                 FakeEmbeddings(latency=args.embed_latency_ms / 1000))
+    client = fake_mongo_client()
+    db.init_db(client, "benchmark")
+    db.init_async_db(FakeAsyncMongoClient(client), "benchmark")
+
+    if args.app == "flask":
+        from app import create_app
+        create_app().run(host="127.0.0.1", port=args.port, threaded=True)
+    else:
+        import uvicorn
+        from asgi import app
+        uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# Deterministic, offline stand-ins for ChatOpenAI, OpenAIEmbeddings and the
+# MongoDB cluster, with configurable latency to mimic the real services
+
+import re
+import json
+import time
+import asyncio
+import hashlib
+import numpy as np
+import mongomock
+from bson import ObjectId
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from utils import normalize_question
+
+
+
+BENCHMARK_EMAIL = "student@benchmark.edu"
+
+
+
+def _usage(prompt, text):
+    input_tokens, output_tokens = len(prompt) // 4, len(text) // 4
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+
+
+# Answers each of the edubot prompts in a fixed way: questions mentioning
+# "my" are personal, pipelines look the student up in `users`
+class FakeChatModel(BaseChatModel):
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+
+    def _respond(self, prompt):
+        question = re.search(r"Question:\s*(.*)", prompt)
+        question = question.group(1).strip() if question else ""
+
+        if "Decide whether the following question is personal" in prompt:
+            return "true" if re.search(r"\bmy\b", question, re.I) else ""
+        if "MongoDB Aggregation Query" in prompt:
+            email = re.search(r"Email:\s*(\S+)", prompt).group(1)
+            return json.dumps([{"$match": {"email": email}}, {"$project": {"name": 1, "gpa": 1}}])
+        if "Raw Result" in prompt:
+            return f"According to your records: {prompt.split('Raw Result:')[1].strip()[:200]}"
+        return f"Here is a short answer to '{question}'."
+
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        prompt = messages[-1].content
+        text = self._respond(prompt)
+        message = AIMessage(content=text, usage_metadata=_usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1].content
+        text = self._respond(prompt)
+        message = AIMessage(content=text, usage_metadata=_usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+    # word by word, with the latency spread across the tokens
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        words = self._respond(prompt).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=_usage(prompt, " ".join(words))))
+
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        words = self._respond(prompt).split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=_usage(prompt, " ".join(words))))
+
+
+
+
+# Bag-of-words embeddings: every word maps to a fixed random direction, so
+# rephrasings of a question land close to each other like real embeddings do
+class FakeEmbeddings(Embeddings):
+
+    def __init__(self, dim=256, latency=0.0):
+        self.dim = dim
+        self.latency = latency
+        self.model = f"fake-embedding-{dim}"
+        self.calls = 0
+        self._words = {}
+
+
+    def _word(self, word):
+        vector = self._words.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little")
+            vector = self._words[word] = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector
+
+
+    def _embed(self, text):
+        words = normalize_question(text).split() or [""]
+        vector = np.sum([self._word(word) for word in words], axis=0)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+
+
+# mongomock database with one student and a few records per collection
+def fake_mongo_client(email=BENCHMARK_EMAIL):
+    client = mongomock.MongoClient()
+    database = client["benchmark"]
+
+    student, course = ObjectId(), ObjectId()
+    database.users.insert_one({"_id": student, "email": email, "name": "Bench Student", "gpa": 8.7,
+                               "role": "student", "department": "CSE", "program": "BTech", "year": 3})
+    database.courses.insert_one({"_id": course, "code": "CS101", "title": "Algorithms", "students": [student],
+                                 "department": "CSE", "credits": 4, "progress": 60})
+    database.marks.insert_many([{"studentId": student, "courseId": course, "title": f"Quiz {i}",
+                                 "score": 7 + i % 3, "maxScore": 10, "type": "quiz"} for i in range(10)])
+    database.attendances.insert_many([{"studentId": student, "courseId": course, "date": f"2025-01-{i + 1:02d}",
+                                       "status": "present" if i % 4 else "absent"} for i in range(20)])
+    return client
+
+
+
+
+# pymongo's AsyncMongoClient interface over the mongomock client, for the ASGI app
+class _FakeAsyncCursor:
+
+    def __init__(self, documents):
+        self.documents = documents
+
+
+    async def to_list(self, length=None):
+        return self.documents[:length] if length else self.documents
+
+
+
+class _FakeAsyncCollection:
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+
+    async def aggregate(self, pipeline, **kwargs):
+        return _FakeAsyncCursor(list(self.collection.aggregate(pipeline, **kwargs)))
+
+
+
+class _FakeAsyncDatabase:
+
+    def __init__(self, database):
+        self.database = database
+
+
+    def __getitem__(self, name):
+        return _FakeAsyncCollection(self.database[name])
+
+
+
+class FakeAsyncMongoClient:
+
+    def __init__(self, client):
+        self.client = client
+
+
+    def __getitem__(self, name):
+        return _FakeAsyncDatabase(self.client[name])
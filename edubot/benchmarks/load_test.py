@@ -0,0 +1,100 @@
+# Fires concurrent /ask requests at one or more running servers and compares
+# throughput and latency, e.g. the Flask app against the ASGI app:
+#
+#   python app.py                          # Flask, port 5000
+#   PORT=5001 python asgi.py               # ASGI
+#   python benchmarks/load_test.py --url http://localhost:5000 --url http://localhost:5001 -n 1000 -c 200
+#
+# or offline, against the fakes with 300 ms of LLM and 50 ms of embedding latency:
+#
+#   python benchmarks/fake_server.py flask --port 5000
+#   python benchmarks/fake_server.py asgi --port 5001
+#   python benchmarks/load_test.py --url http://localhost:5000 --url http://localhost:5001 -n 1000 -c 200 \
+#       --email student@benchmark.edu --fresh
+#
+# Offline results, 1000 requests, servers and client sharing one CPU core:
+#
+#                             Flask                      ASGI
+#   --fresh, -c 50      92 req/s  p50  532 ms      102 req/s  p50 471 ms
+#   --fresh, -c 200    146 req/s  p50 1193 ms      188 req/s  p50 941 ms
+#   QUESTIONS, -c 50   205 req/s  p50  159 ms      212 req/s  p50 142 ms
+#   QUESTIONS, -c 200  193 req/s  p50  153 ms      248 req/s  p50  92 ms
+#
+# With every request waiting on the models, ASGI served about 10% more
+# requests at 50 in flight and 30% more at 200. Both were CPU bound on that
+# core well before the model latency was, so these numbers say little about
+# a multi-core host talking to OpenAI and Atlas, where it was not measured.
+
+import time
+import uuid
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+
+QUESTIONS = [
+    "is vim better than emacs",
+    "what is the difference between linux and freebsd",
+    "what is my attendance in all courses",
+    "what is my gpa",
+    "explain recursion with an example",
+]
+
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+
+def run(url, requests_total, concurrency, email, fresh=False):
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(i):
+        # a made-up topic misses every cache, so the request waits on the models
+        query = f"what is {uuid.uuid4().hex}" if fresh else QUESTIONS[i % len(QUESTIONS)]
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/ask", json={"query": query, "email": email}, timeout=120)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests_total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, ok in results if ok]
+    errors = len(results) - len(latencies)
+    if not latencies:
+        print(f"{url}: all {errors} requests failed")
+        return
+
+    print(f"{url}: {len(latencies) / elapsed:.1f} req/s  "
+          f"p50={1000 * percentile(latencies, 50):.0f}ms  p95={1000 * percentile(latencies, 95):.0f}ms  "
+          f"p99={1000 * percentile(latencies, 99):.0f}ms  mean={1000 * statistics.mean(latencies):.0f}ms  errors={errors}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", action="append", required=True)
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--email", default="student@example.com")
+    parser.add_argument("--fresh", action="store_true", help="ask a new question every time instead of QUESTIONS")
+    args = parser.parse_args()
+
+    for url in args.url:
+        run(url.rstrip("/"), args.requests, args.concurrency, args.email, args.fresh)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Cold-start profile: time to import app, create the Flask app and answer the
+# first request (GET /, the health check), in fresh interpreters, plus the
+# slowest top-level imports from `python -X importtime`.
+#
+#   python benchmarks/startup_profile.py
+#   python benchmarks/startup_profile.py --compare HEAD~1     # same numbers for an older revision
+#
+# --compare checks the revision out into a temporary git worktree.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+EDUBOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+CHILD = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+application.test_client().get("/")
+served = time.perf_counter()
+print("STARTUP", imported - start, created - imported, served - created)
+"""
+
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "startup-profile")
+    env.setdefault("RESULT_CACHE_WATCH", "0")
+    return env
+
+
+
+def measure(directory, runs):
+    os.makedirs(os.path.join(directory, "logs"), exist_ok=True)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD], cwd=directory, env=child_env(),
+                                capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - start
+        line = next(line for line in output.splitlines() if line.startswith("STARTUP"))
+        imported, created, served = map(float, line.split()[1:])
+        samples.append({"import_app": imported, "create_app": created, "first_request": served,
+                        "process_to_first_request": total})
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+
+# (cumulative seconds, module) of the slowest imports up to three levels below `import app`
+def slowest_imports(directory, top):
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=directory, env=child_env(),
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 3:
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+
+def report(label, directory, runs, top):
+    timings = measure(directory, runs)
+    print(f"\n{label}")
+    for key, value in timings.items():
+        print(f"  {key:<26} {1000 * value:8.1f} ms")
+    print("  slowest imports:")
+    for seconds, name in slowest_imports(directory, top):
+        print(f"    {1000 * seconds:8.1f} ms  {name}")
+    return timings
+
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--compare", help="git revision to profile as well")
+    args = parser.parse_args()
+
+    current = report("working tree", EDUBOT, args.runs, args.top)
+    if not args.compare:
+        return
+
+    root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=EDUBOT,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    worktree = tempfile.mkdtemp(prefix="edubot-startup-")
+    subprocess.run(["git", "worktree", "add", "--detach", worktree, args.compare], cwd=root,
+                   capture_output=True, check=True)
+    try:
+        # the cache files are not tracked; give the old revision the same ones
+        directory = os.path.join(worktree, os.path.relpath(EDUBOT, root))
+        shutil.copytree(os.path.join(EDUBOT, "cache"), os.path.join(directory, "cache"), dirs_exist_ok=True)
+        previous = report(args.compare, directory, args.runs, args.top)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=root, capture_output=True)
+
+    print()
+    for key in current:
+        print(f"  {key:<26} {1000 * previous[key]:8.1f} ms -> {1000 * current[key]:8.1f} ms")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# How many rows a similarity search scores with the topic index, against the
+# full scan it replaces, on a cache of course questions: a few thousand topics
+# ("organic chemistry", "newton laws", ...) asked about in different words,
+# with the popular topics asked about far more often.
+#
+#   python benchmarks/topic_benchmark.py --sizes 10000 100000
+#
+# For each size it reports the candidate set per query (median, p95, and as a
+# share of the cache), how often the full search is used instead, the latency
+# of both paths, and how often each finds as good a match as an exhaustive
+# search (exact scores of every row) does; past ANN_MIN_SIZE the full scan is
+# the approximate IVF search while the topic candidates are scored exactly.
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="edubot-topics-")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CACHE_DIR"] = os.path.join(WORKDIR, "cache")
+os.environ["EMBEDDING_MEMO_FILE"] = ""
+os.environ.setdefault("CACHE_FSYNC", "0")
+os.environ.setdefault("CACHE_MAX_ENTRIES", str(10 ** 8))
+os.environ.setdefault("CACHE_MAX_BYTES", str(10 ** 12))
+os.makedirs(os.path.join(os.getcwd(), "logs"), exist_ok=True)
+
+import numpy as np
+
+
+
+SUBJECTS = """physics chemistry biology calculus algebra geometry statistics probability economics history
+geography literature grammar programming databases networks compilers thermodynamics genetics ecology
+astronomy geology psychology sociology philosophy accounting marketing finance electronics mechanics""".split()
+
+CONCEPTS = """laws equations theory basics history applications examples formulas principles models experiments
+structure functions properties classification limits derivatives integrals matrices vectors graphs
+algorithms proofs definitions terminology methods systems processes cycles reactions""".split()
+
+TEMPLATES = ["what is {}", "explain {}", "tell me about {}", "notes on {}", "give me a summary on {}",
+             "how does {} work", "important questions on {}", "can you teach me about {}", "{} for beginners"]
+
+
+
+def questions(rng, n, topics):
+    # popular topics are asked about far more often (Zipf)
+    weights = 1 / np.arange(1, len(topics) + 1) ** 1.1
+    picks = rng.choice(len(topics), n, p=weights / weights.sum())
+    templates = rng.integers(0, len(TEMPLATES), n)
+    return [TEMPLATES[t].format(topics[p]) for p, t in zip(picks, templates)]
+
+
+
+# the search before the topic index: score every row, then split the topic of
+# each candidate; (answer, similarity) of the first one on the same topic
+def full_scan(cache_service, query, embedding, threshold, exact=False):
+    from utils import extract_main_topic
+    query_topic = extract_main_topic(query)
+    ids, scores = cache_service.index.search(embedding, min_score=threshold, exact=exact)
+    for idx, similarity in zip(ids.tolist(), scores.tolist()):
+        cached_topic = extract_main_topic(cache_service.store.questions[idx])
+        if query_topic in cached_topic or cached_topic in query_topic:
+            return cache_service.store.answers[idx], similarity
+    return None, 0
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    from services import llm_service
+    from fakes import FakeEmbeddings
+    embeddings = FakeEmbeddings(dim=args.dim)
+    llm_service.configure_models(embedding_model=embeddings)
+
+    from services import cache_service
+    from utils import extract_main_topic
+
+    rng = np.random.default_rng(0)
+    topics = [f"{subject} {concept}" for subject in SUBJECTS for concept in CONCEPTS]
+    rng.shuffle(topics)
+
+    print(f"{'size':>8} | {'candidates p50/p95':>18} | {'share':>6} | {'full':>5} | "
+          f"{'scan ms':>8} | {'topic ms':>8} | {'scan ok':>7} | {'topic ok':>8}")
+    for size in sorted(args.sizes):
+        missing = size - len(cache_service.store)
+        if missing > 0:
+            batch = questions(rng, missing, topics)
+            cache_service.bulk_add_to_cache([(q, f"answer {len(cache_service.store) + i}", e) for i, (q, e)
+                                             in enumerate(zip(batch, embeddings.embed_documents(batch)))])
+
+        queries = questions(rng, args.queries, topics)
+        vectors = embeddings.embed_documents(queries)
+        sizes, full, scan_times, topic_times, scan_ok, topic_ok = [], 0, [], [], 0, 0
+        for query, vector in zip(queries, vectors):
+            candidates = cache_service.topic_index.candidates(extract_main_topic(query))
+            if candidates is None:
+                full += 1
+                sizes.append(len(cache_service.index))
+            else:
+                sizes.append(len(candidates))
+
+            start = time.perf_counter()
+            _, before = full_scan(cache_service, query, vector, args.threshold)
+            scan_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _, after = cache_service.search_similar(query, vector, args.threshold)
+            topic_times.append(time.perf_counter() - start)
+            # duplicates of a question tie, so the similarity is compared rather than the answer
+            _, expected = full_scan(cache_service, query, vector, args.threshold, exact=True)
+            scan_ok += abs(before - expected) < 1e-5
+            topic_ok += abs(after - expected) < 1e-5
+
+        p95 = sorted(sizes)[int(0.95 * len(sizes))]
+        print(f"{len(cache_service.store):>8} | {statistics.median(sizes):>8.0f} {p95:>9} | "
+              f"{statistics.mean(sizes) / len(cache_service.store):>6.1%} | {full / len(queries):>5.0%} | "
+              f"{1000 * statistics.median(scan_times):>8.3f} | {1000 * statistics.median(topic_times):>8.3f} | "
+              f"{scan_ok / len(queries):>7.0%} | {topic_ok / len(queries):>8.0%}")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -11,14 +11,68 @@ SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
 
 # MongoDB config
 MONGODB_URI = os.getenv("MONGODB_URI")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "test")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 5))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 10000))
+# secondaries may lag behind a grade just written, so reading from them is opt-in ("secondaryPreferred")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")     # e.g. "zstd,snappy,zlib" when those packages are installed
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
 
-# cache file 
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "./cache/"))
-CACHE_FILE = os.path.join(BASE_DIR, "cache.json")
+# cache files 
+BASE_DIR = os.path.abspath(os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), "./cache/")))
+CACHE_FILE = os.path.join(BASE_DIR, "cache.json")     # legacy JSON cache, migrated into the store once
+CACHE_FSYNC = os.getenv("CACHE_FSYNC", "1") == "1"
+COMPACT_DEAD_RATIO = float(os.getenv("COMPACT_DEAD_RATIO", 0.3))   # compact once this share of records is dead
+REMAP_ROWS = int(os.getenv("REMAP_ROWS", 4096))     # re-mmap the embedding file once this many rows sit in RAM
+CACHE_FLUSH_INTERVAL_MS = float(os.getenv("CACHE_FLUSH_INTERVAL_MS", 200))  # background writer period, 0 writes on the request thread
+CACHE_FLUSH_BATCH = int(os.getenv("CACHE_FLUSH_BATCH", 256))    # wake the writer early once this many records are pending
+
+# cache eviction
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 100000))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 512 * 1024 * 1024))
+CACHE_EVICTION = os.getenv("CACHE_EVICTION", "lru")            # "lru" or "lfu"
+CACHE_TTL = float(os.getenv("CACHE_TTL", 30 * 24 * 3600))      # seconds, 0 disables expiry
+
+# local personal-query classifier in front of the LLM one
+CLASSIFIER_CONFIDENCE = float(os.getenv("CLASSIFIER_CONFIDENCE", 0.9))    # below this the LLM decides
+CLASSIFIER_MIN_EXAMPLES = int(os.getenv("CLASSIFIER_MIN_EXAMPLES", 25))   # LLM verdicts per class before the embedding model is trusted
+
+# generated Mongo pipelines, reused across students asking the same thing
+PLAN_CACHE_FILE = os.path.join(BASE_DIR, "plans.json")
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", 5000))
+PLAN_CACHE_SAVE_INTERVAL = float(os.getenv("PLAN_CACHE_SAVE_INTERVAL", 5))   # seconds between saves of new plans, 0 saves on the request thread
+
+# /metrics: latency quantiles are computed over the most recent samples of each stage
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 1024))
+
+# per-student results of personal queries
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 120))          # seconds
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+RESULT_CACHE_WATCH = os.getenv("RESULT_CACHE_WATCH", "1") == "1"      # invalidate from MongoDB change streams
+
+# embedding memo and request batching
+EMBEDDING_MEMO_SIZE = int(os.getenv("EMBEDDING_MEMO_SIZE", 10000))
+EMBEDDING_MEMO_FILE = os.getenv("EMBEDDING_MEMO_FILE", os.path.join(BASE_DIR, "embeddings.sqlite"))  # empty keeps it in memory only
+EMBEDDING_MEMO_SAVE_INTERVAL = float(os.getenv("EMBEDDING_MEMO_SAVE_INTERVAL", 1))   # seconds between writes of new embeddings to the file, 0 writes on the request thread
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", 10))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+
+# semantic cache search
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.85))
+ANN_MIN_SIZE = int(os.getenv("ANN_MIN_SIZE", 20000))    # switch from exact search to the IVF index at this size
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", 16))           # IVF lists scored per query
+SPECULATIVE_SIMILARITY = float(os.getenv("SPECULATIVE_SIMILARITY", 0.95))  # a similar hit this close answers before classification does, when the rules lean general
+TOPIC_MAX_CANDIDATES = float(os.getenv("TOPIC_MAX_CANDIDATES", 0.25))  # beyond this share of the cache, a topic's rows are scored by a full search instead
 
 
 # Flask config
 PORT = int(os.environ.get("PORT", 5000))
+WARM_UP = os.getenv("WARM_UP", "1") == "1"      # build models, clients and the cache in the background after startup
 
 
 
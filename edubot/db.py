@@ -1,30 +1,180 @@
-from pymongo import MongoClient
-from config import MONGODB_URI, logger
-
-# initialize connection
-client = MongoClient(MONGODB_URI)
-db = client["test"]
-
-# collections in MongoDB cluster
-user_collection = db["users"]
-courses_collection = db["courses"]
-marks_collection = db["marks"]
-attendance_collection = db["attendances"]
-remarks_collection = db["professorremarks"]
-assignments_collection = db["assignments"]
-assignment_submission_collection = db["assignmentsubmissions"]
-
-
-
-all_collections = [
-    user_collection, 
-    courses_collection, 
-    marks_collection, 
-    attendance_collection, 
-    remarks_collection, 
-    assignments_collection, 
-    assignment_submission_collection
+import threading
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING
+from config import (
+    MONGODB_URI, MONGO_DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_READ_PREFERENCE, MONGO_COMPRESSORS, logger
+)
+
+
+COLLECTION_NAMES = [
+    "users",
+    "courses",
+    "marks",
+    "attendances",
+    "professorremarks",
+    "assignments",
+    "assignmentsubmissions",
 ]
 
 
-logger.info("MongoDB collections initialized")
\ No newline at end of file
+# indexes for the fields generated pipelines filter and join on
+INDEXES = {
+    "users": [[("email", ASCENDING)]],
+    "courses": [[("students", ASCENDING)], [("professor", ASCENDING)]],
+    "marks": [[("studentId", ASCENDING), ("courseId", ASCENDING)], [("courseId", ASCENDING)]],
+    "attendances": [[("studentId", ASCENDING), ("courseId", ASCENDING)], [("courseId", ASCENDING)]],
+    "professorremarks": [[("studentId", ASCENDING), ("courseId", ASCENDING)]],
+    "assignments": [[("courseId", ASCENDING)]],
+    "assignmentsubmissions": [[("uploader", ASCENDING)], [("courseId", ASCENDING)], [("assignmentId", ASCENDING)]],
+}
+
+
+
+def client_options(**overrides):
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "compressors": MONGO_COMPRESSORS,
+        "retryReads": True,
+        "appname": "edubot",
+    }
+    options.update(overrides)
+    return options
+
+
+
+def create_client(uri=MONGODB_URI, client_class=MongoClient, **overrides):
+    return client_class(uri, **client_options(**overrides))
+
+
+
+# Clients are created on first use: building one resolves mongodb+srv DNS
+# records, which used to hold up startup. Callers go through get_db() and the
+# get_*collections() helpers; the collection lists are filled in place, so
+# references taken before initialization see them too.
+client = None
+db = None
+all_collections = []
+
+async_client = None
+async_db = None
+async_all_collections = []
+
+_init_lock = threading.RLock()
+
+
+
+# point the module at another client, e.g. a local mongod or mongomock in tests
+def init_db(sync_client=None, database_name=MONGO_DB_NAME):
+    global client, db
+    with _init_lock:
+        client = sync_client or create_client()
+        db = client[database_name]
+        all_collections[:] = [db[name] for name in COLLECTION_NAMES]
+    logger.info("MongoDB collections initialized")
+    return db
+
+
+
+# async driver for the ASGI app; it binds to the event loop on first use
+def init_async_db(async_mongo_client=None, database_name=MONGO_DB_NAME):
+    global async_client, async_db
+    with _init_lock:
+        async_client = async_mongo_client or create_client(client_class=AsyncMongoClient)
+        async_db = async_client[database_name]
+        async_all_collections[:] = [async_db[name] for name in COLLECTION_NAMES]
+    return async_db
+
+
+
+def get_db():
+    if db is None:
+        with _init_lock:
+            if db is None:
+                init_db()
+    return db
+
+
+
+def get_collections():
+    get_db()
+    return all_collections
+
+
+
+def get_async_collections():
+    if async_db is None:
+        with _init_lock:
+            if async_db is None:
+                init_async_db()
+    return async_all_collections
+
+
+
+
+# create any missing index from INDEXES; returns the names that were created
+def ensure_indexes(database=None):
+    database = database if database is not None else get_db()
+    created = []
+    for name, indexes in INDEXES.items():
+        existing = {tuple(info["key"]) for info in database[name].index_information().values()}
+        for keys in indexes:
+            if tuple(keys) not in existing:
+                created.append(database[name].create_index(keys))
+    if created:
+        logger.info(f"Created MongoDB indexes: {created}")
+    return created
+
+
+
+# indexes from INDEXES that the database does not have, as (collection, keys)
+def missing_indexes(database=None):
+    database = database if database is not None else get_db()
+    missing = []
+    for name, indexes in INDEXES.items():
+        existing = {tuple(info["key"]) for info in database[name].index_information().values()}
+        missing.extend((name, keys) for keys in indexes if tuple(keys) not in existing)
+    return missing
+
+
+
+def _plan_stages(node):
+    stages = []
+    if isinstance(node, dict):
+        if "stage" in node:
+            stages.append(node["stage"])
+        for value in node.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(node, list):
+        for item in node:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+
+# the aggregate explain output nests a winningPlan per $cursor stage (or shard)
+def _winning_plans(node):
+    if isinstance(node, dict):
+        if "winningPlan" in node:
+            yield node["winningPlan"]
+            return
+        for value in node.values():
+            yield from _winning_plans(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _winning_plans(item)
+
+
+
+# winning-plan stages of an aggregation, e.g. ["FETCH", "IXSCAN"] or ["COLLSCAN"]
+def explain_pipeline(collection, pipeline):
+    explanation = collection.database.command(
+        "explain", {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}, verbosity="queryPlanner"
+    )
+    return [stage for plan in _winning_plans(explanation) for stage in _plan_stages(plan)]
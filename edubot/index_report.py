@@ -0,0 +1,37 @@
+# Checks the MongoDB indexes edubot relies on and explains the cached query
+# plans to show which of them end up scanning whole collections.
+#
+#   python index_report.py                       # report only
+#   python index_report.py --create              # create missing indexes first
+#   python index_report.py --email me@uni.edu    # bind cached plans to this email
+
+import json
+import argparse
+from db import ensure_indexes, missing_indexes
+from services.plan_cache import plans, _bind
+from services.query_service import collscan_report
+
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--create", action="store_true", help="create missing indexes")
+    parser.add_argument("--email", default="student@example.com", help="email bound into cached plans")
+    args = parser.parse_args()
+
+    if args.create:
+        print("Created:", ensure_indexes() or "nothing, all indexes exist")
+
+    missing = missing_indexes()
+    print("Missing indexes:", json.dumps(missing) if missing else "none")
+
+    pipelines = [_bind(template, args.email) for template in plans.plans.values()]
+    print(f"Explaining {len(pipelines)} cached query plans")
+    for entry in collscan_report(pipelines):
+        status = "ERROR " + entry["error"] if "error" in entry else ("COLLSCAN" if entry["collscan"] else "ok")
+        print(f"[{status}] {entry['collection']}: {json.dumps(entry['pipeline'], default=str)}")
+
+
+
+if __name__ == "__main__":
+    main()
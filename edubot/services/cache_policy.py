@@ -0,0 +1,115 @@
+import time
+import heapq
+from config import CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_EVICTION, CACHE_TTL, logger
+
+
+# evictions free space down to this share of the budget, so they happen in batches
+LOW_WATERMARK = 0.9
+
+
+
+# Per-entry bookkeeping for the answer cache: creation time, last access,
+# hit count and approximate size. It only picks victims; removing them from
+# the store and the indexes is up to the caller.
+class CachePolicy:
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 eviction=CACHE_EVICTION, ttl=CACHE_TTL):
+        if eviction not in ("lru", "lfu"):
+            raise ValueError(f"Unknown cache eviction policy: {eviction}")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.ttl = ttl
+        self.meta = {}          # id -> [created, last_access, hits, size], in insertion order
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+    def __len__(self):
+        return len(self.meta)
+
+
+    def track(self, idx, size, created=None):
+        created = time.time() if created is None else created
+        self.meta[idx] = [created, created, 0, size]
+        self.total_bytes += size
+
+
+    def forget(self, idx):
+        entry = self.meta.pop(idx, None)
+        if entry:
+            self.total_bytes -= entry[3]
+
+
+    def touch(self, idx):
+        entry = self.meta.get(idx)
+        if entry:
+            entry[1] = time.time()
+            entry[2] += 1
+
+
+    def hits(self, idx):
+        entry = self.meta.get(idx)
+        return entry[2] if entry else 0
+
+
+    def is_expired(self, idx, now=None):
+        entry = self.meta.get(idx)
+        if entry is None or not self.ttl:
+            return False
+        return (now or time.time()) - entry[0] > self.ttl
+
+
+    def _rank(self, entry):
+        created, last_access, hits, _ = entry
+        if self.eviction == "lfu":
+            return (hits, last_access)
+        return (last_access,)
+
+
+    # ids to drop: every expired entry, then the least recently (or frequently)
+    # used ones until both the entry and the byte budget are met
+    def victims(self):
+        # ids are tracked in insertion order, so expired entries form a prefix
+        now = time.time()
+        expired = []
+        if self.ttl:
+            for idx, entry in self.meta.items():
+                if now - entry[0] <= self.ttl:
+                    break
+                expired.append(idx)
+        self.expirations += len(expired)
+
+        entries = len(self.meta) - len(expired)
+        size = self.total_bytes - sum(self.meta[idx][3] for idx in expired)
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return expired
+
+        target_entries = int(self.max_entries * LOW_WATERMARK)
+        target_bytes = int(self.max_bytes * LOW_WATERMARK)
+        skip = set(expired)
+        heap = [(self._rank(entry), idx) for idx, entry in self.meta.items() if idx not in skip]
+        heapq.heapify(heap)
+
+        victims = []
+        while heap and (entries > target_entries or size > target_bytes):
+            _, idx = heapq.heappop(heap)
+            victims.append(idx)
+            entries -= 1
+            size -= self.meta[idx][3]
+
+        self.evictions += len(victims)
+        logger.info(f"Evicting {len(victims)} cache entries ({self.eviction}) and {len(expired)} expired ones")
+        return expired + victims
+
+
+    # follow the store's id renumbering after a compaction
+    def remap(self, mapping):
+        meta = {}
+        for idx, entry in self.meta.items():
+            if idx < len(mapping) and mapping[idx] >= 0:
+                meta[int(mapping[idx])] = entry
+        self.meta = meta
+        self.total_bytes = sum(entry[3] for entry in meta.values())
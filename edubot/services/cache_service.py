@@ -1,83 +1,188 @@
-import os
-import json
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from services.llm_service import embeddings
-from config import CACHE_FILE, logger
+import asyncio
+import threading
+from services.embedding_service import embed_query, aembed_query
+from services.vector_index import VectorIndex
+from services.topic_index import TopicIndex
+from services.cache_store import CacheStore, migrate_json_cache
+from services.cache_policy import CachePolicy
+from services import metrics
+from utils import normalize_question, extract_main_topic
+from config import BASE_DIR, CACHE_FILE, SIMILARITY_THRESHOLD, REMAP_ROWS, logger
 
 
 
 def load_cache():
-    if os.path.exists(CACHE_FILE):
-        logger.info(f"Loading cache from {CACHE_FILE}")
-        try:
-            with open(CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading cache: {e}")
-            return {"questions": [], "embeddings": [], "answers": []}
-    logger.info("No cache file found, creating new cache")
-    return {"questions": [], "embeddings": [], "answers": []}
+    logger.info(f"Loading cache store from {BASE_DIR}")
+    store = CacheStore(BASE_DIR).open()
+    try:
+        migrate_json_cache(CACHE_FILE, store)
+    except Exception as e:
+        logger.error(f"Error migrating {CACHE_FILE}, starting without it: {e}")
+    return store
 
 
-cache = load_cache()
+# normalized question -> id of its latest live entry
+def build_exact_index():
+    return {normalize_question(q): idx for idx, q in enumerate(store.questions) if store.live[idx]}
 
 
+def build_topic_index():
+    topics = TopicIndex()
+    topics.rebuild(store.topics, store.live)
+    return topics
 
-# extract main topic from the query
-def extract_main_topic(query):
-    topic = query.split("on ")[-1].strip().lower()
-    if topic == query.lower():  # if "on" wasn't found
-        topic = query.split("about ")[-1].strip().lower()
-    
-    return topic
 
+def _entry_size(idx):
+    return len(store.questions[idx].encode("utf-8")) + len(store.answers[idx].encode("utf-8")) + 4 * (store.dim or 0)
+
+
+# Evicted entries are tombstoned in the store and dropped from the exact-match
+# index right away; the similarity index skips dead rows until the next
+# compaction rebuilds it without them.
+def _evict(ids):
+    if not ids:
+        return
+    for idx in ids:
+        policy.forget(idx)
+        key = normalize_question(store.questions[idx])
+        if exact_index.get(key) == idx:
+            del exact_index[key]
+    store.delete(ids)
+
+
+def _track_all():
+    global policy
+    policy = CachePolicy()
+    for idx, alive in enumerate(store.live):
+        if alive:
+            policy.track(idx, _entry_size(idx), created=store.created[idx])
+
+
+# ids are renumbered by compaction, so the indexes and the policy follow the
+# new file; after another worker's compaction there is no mapping to follow
+def _reindex(mapping):
+    global exact_index, topic_index
+    index.attach(store.mapped_rows())
+    exact_index = build_exact_index()
+    topic_index = build_topic_index()
+    if mapping is None:
+        _track_all()
+    else:
+        policy.remap(mapping)
+
+
+# entries other workers added or deleted; their rows are already in the shared file
+def _absorb(start, deleted):
+    if len(store.questions) > start:
+        index.remap(store.mapped_rows())
+    for idx in range(start, len(store.questions)):
+        if store.live[idx]:
+            exact_index[normalize_question(store.questions[idx])] = idx
+            topic_index.add(idx, store.topics[idx])
+            policy.track(idx, _entry_size(idx), created=store.created[idx])
+    for idx in deleted:
+        policy.forget(idx)
+        key = normalize_question(store.questions[idx])
+        if exact_index.get(key) == idx:
+            del exact_index[key]
+
+
+
+# The store is opened and the indexes are built on first use rather than at
+# import, so the server binds its port before the cache files are read.
+# `cache_service.store`, `.index`, `.exact_index`, `.topic_index` and `.policy`
+# load it too.
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load():
+    global store, index, exact_index, topic_index, _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        store = load_cache()
+        index = VectorIndex()
+        index.attach(store.mapped_rows())
+        exact_index = build_exact_index()
+        topic_index = build_topic_index()
+
+        _track_all()
+        _evict(policy.victims())
+
+        store.on_compact(_reindex)
+        store.on_refresh(_absorb)
+        _loaded = True
+
+
+def __getattr__(name):
+    if name in ("store", "index", "exact_index", "topic_index", "policy"):
+        load()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+def _collect():
+    if not _loaded:
+        return []
+    return [
+        ("edubot_answer_cache_entries", "gauge", {}, len(store)),
+        ("edubot_answer_cache_bytes", "gauge", {}, policy.total_bytes),
+        ("edubot_answer_cache_evictions_total", "counter", {}, policy.evictions),
+        ("edubot_answer_cache_expirations_total", "counter", {}, policy.expirations),
+    ]
+
+
+metrics.register_collector(_collect)
 
 
 
 # finding semantically similar question from the cache
-def find_similar_question(query, similarity_threshold=0.85):
+@metrics.timed("cache.similar_search")
+def find_similar_question(query, similarity_threshold=SIMILARITY_THRESHOLD):
+    load()
+    store.refresh()
     logger.info(f"Checking for semantically similar questions to: {query}")
     
-    if not cache["questions"]:
+    if not len(store):
         logger.info("Cache is empty")
         return None, 0
     
-    query_topic = extract_main_topic(query)
-    logger.info(f"Extracted topic: {query_topic}")
+    try:
+        return search_similar(query, embed_query(query), similarity_threshold)
+    except Exception as e:
+        logger.error(f"Error in similarity search: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+    
+    return None, 0
+
+
+
+def _refresh():
+    load()
+    store.refresh()
+    return len(store)
+
+
+
+# loading, refreshing and searching the store read files and wait on
+# store.lock, which writers and compaction hold: they run in worker threads
+@metrics.timed("cache.similar_search")
+async def afind_similar_question(query, similarity_threshold=SIMILARITY_THRESHOLD):
+    size = await asyncio.to_thread(_refresh)
+    logger.info(f"Checking for semantically similar questions to: {query}")
+    
+    if not size:
+        logger.info("Cache is empty")
+        return None, 0
     
     try:
-        query_embedding = embeddings.embed_query(query)
-        
-        cache_embeddings = []
-        for emb in cache["embeddings"]:
-            if isinstance(emb, str):
-                emb = json.loads(emb)
-            cache_embeddings.append(emb)
-        
-        best_match_idx = -1
-        max_similarity = 0
-        
-        for i, cached_question in enumerate(cache["questions"]):
-            cached_topic = extract_main_topic(cached_question)
-            
-            if query_topic in cached_topic or cached_topic in query_topic:
-                # Calculate cosine similarity
-                similarity = cosine_similarity(
-                    np.array(query_embedding).reshape(1, -1),
-                    np.array(cache_embeddings[i]).reshape(1, -1)
-                )[0][0]
-                
-                if similarity > max_similarity:
-                    max_similarity = similarity
-                    best_match_idx = i
-        
-        if best_match_idx >= 0 and max_similarity >= similarity_threshold:
-            logger.info(f"Most similar question: '{cache['questions'][best_match_idx]}' with similarity: {max_similarity:.4f}")
-            return cache["answers"][best_match_idx], max_similarity
-        else:
-            logger.info(f"No good match found. Best similarity was {max_similarity:.4f}")
-                
+        query_embedding = await aembed_query(query)
+        return await asyncio.to_thread(search_similar, query, query_embedding, similarity_threshold)
     except Exception as e:
         logger.error(f"Error in similarity search: {e}")
         import traceback
@@ -87,29 +192,112 @@ def find_similar_question(query, similarity_threshold=0.85):
 
 
 
+# similarity search for an already embedded query
+def search_similar(query, query_embedding, similarity_threshold=SIMILARITY_THRESHOLD):
+    load()
+    query_topic = extract_main_topic(query)
+    logger.info(f"Extracted topic: {query_topic}")
+    
+    # only rows whose topic may contain the query topic or be inside it are
+    # scored (unless they are most of the cache); of the candidates
+    # above the threshold, best first, the first one on the same topic wins
+    with store.lock:
+        topic_ids = topic_index.candidates(query_topic)
+        ids, scores = index.search(query_embedding, min_score=similarity_threshold, ids=topic_ids)
+        candidates = [(idx, store.questions[idx], store.answers[idx], store.topics[idx], similarity)
+                      for idx, similarity in zip(ids.tolist(), scores.tolist())
+                      if store.live[idx] and not policy.is_expired(idx)]
+        scored = len(index) if topic_ids is None else len(topic_ids)
+    metrics.inc("edubot_similarity_rows_scored_total", scored, plan="full" if topic_ids is None else "topic")
+    
+    for idx, cached_question, cached_answer, cached_topic, similarity in candidates:
+        if query_topic in cached_topic or cached_topic in query_topic:
+            logger.info(f"Most similar question: '{cached_question}' with similarity: {similarity:.4f}")
+            with store.lock:
+                policy.touch(idx)
+            return cached_answer, similarity
+    
+    logger.info(f"No good match found among {len(ids)} candidates above {similarity_threshold}")
+    return None, 0
+
+
+
+
+
+# add many (question, answer, embedding) entries with one write per file, e.g. to warm the cache
+@metrics.timed("cache.bulk_add")
+def bulk_add_to_cache(entries):
+    load()
+    if not entries:
+        return
+    with store.lock:
+        start = store.extend(entries)
+        index.remap(store.mapped_rows())
+        for idx in range(start, len(store.questions)):
+            exact_index[normalize_question(store.questions[idx])] = idx
+            topic_index.add(idx, store.topics[idx])
+            policy.track(idx, _entry_size(idx))
+        _evict(policy.victims())
+
+    logger.info(f"Added {len(entries)} questions to cache")
+
 
 
 # add a new question to cache
-def add_to_cache(query, answer):
-    query_embedding = embeddings.embed_query(query)
-    if isinstance(query_embedding, np.ndarray):
-        query_embedding = query_embedding.tolist()
+@metrics.timed("cache.add")
+def add_to_cache(query, answer, query_embedding=None):
+    load()
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+
+    key = normalize_question(query)
+    with store.lock:
+        # a concurrent request for the same question, maybe in another worker, got here first
+        store.refresh()
+        idx = exact_index.get(key)
+        if idx is not None and store.live[idx] and not policy.is_expired(idx):
+            logger.info(f"Question already cached: {query[:50]}...")
+            return
 
-    cache["questions"].append(query)
-    cache["embeddings"].append(query_embedding)
-    cache["answers"].append(answer)
+        idx = store.append(query, answer, query_embedding)
+        index.add(query_embedding)
+        exact_index[key] = idx
+        topic_index.add(idx, store.topics[idx])
+        policy.track(idx, _entry_size(idx))
+        _evict(policy.victims())
 
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(cache, f, indent=4)
+        # hand the rows kept in RAM back to the page cache
+        if index.matrix.tail_size >= REMAP_ROWS:
+            index.remap(store.mapped_rows())
         
     logger.info(f"Added question to cache: {query[:50]}...")
 
 
 
+async def aadd_to_cache(query, answer):
+    query_embedding = await aembed_query(query)
+    # the store append is blocking disk I/O
+    await asyncio.to_thread(add_to_cache, query, answer, query_embedding)
+
+
 
-# check if the exact same question exists in the cache
+
+# check if the same question (up to case, spacing and punctuation) exists in the cache
+@metrics.timed("cache.exact_match")
 def get_exact_match(query):
-    if query in cache["questions"]:
-        idx = cache["questions"].index(query)
-        return cache["answers"][idx]
-    return None
+    load()
+    store.refresh()
+    with store.lock:
+        idx = exact_index.get(normalize_question(query))
+        if idx is None:
+            return None
+        if policy.is_expired(idx):
+            _evict([idx])
+            return None
+        policy.touch(idx)
+        return store.answers[idx]
+
+
+
+async def aget_exact_match(query):
+    return await asyncio.to_thread(get_exact_match, query)
@@ -0,0 +1,220 @@
+import re
+import threading
+import numpy as np
+from services import llm_service
+from services.embedding_service import embed_query, aembed_query, memo, content_key
+from services import metrics
+from config import CLASSIFIER_CONFIDENCE, CLASSIFIER_MIN_EXAMPLES, logger
+
+
+# Cheap stages in front of llm_service.is_personal_query:
+#   1. rules: the student's own records ("my grades", "did I pass the exam")
+#      are personal; a question with no first person and no schema term is
+#      not. Each verdict is as confident as its evidence, so only the clear
+#      cases clear CLASSIFIER_CONFIDENCE
+#   2. a logistic model over the query embedding, trained online on the
+#      LLM's own verdicts
+# Only questions both stages are unsure about reach the LLM.
+
+# possessive and subject forms only: "explain to me ..." asks nothing about the student
+POSSESSIVE = re.compile(r"\b(my|mine)\b")
+SUBJECT = re.compile(r"\b(am|did|have|was|were) i\b|\bi (have|had|got|scored|am|was|passed|failed)\b")
+ANY_FIRST_PERSON = re.compile(r"\b(i|me|my|mine|myself|we|us|our)\b")
+GENERAL_OPENER = re.compile(r"^\s*(what (is|are|does|do)|explain|define|describe|how (does|do|to)|why|difference between)\b")
+
+# schema fields that are too generic to hint at academic records on their own
+GENERIC_FIELDS = {"id", "at", "max", "created", "text", "type", "date", "title", "description", "code",
+                  "status", "progress", "student", "students", "user", "users", "name"}
+
+# everyday words for what the schema stores
+SYNONYMS = {"mark", "grade", "score", "cgpa", "gpa", "attendance", "absent", "present", "class", "subject",
+            "course", "remark", "assignment", "submission", "deadline", "due", "result", "exam", "credit",
+            "semester", "role", "feedback", "professor"}
+
+stats = {"rules": 0, "model": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+
+
+# collection names and field words from the prompt schema
+def schema_terms(schema):
+    terms = set()
+    for collection, fields in schema.items():
+        terms.add(collection.lower())
+        for field in fields:
+            terms.update(word.lower() for word in re.findall(r"[a-z]+|[A-Z][a-z]*", field))
+    return {_stem(term) for term in terms - GENERIC_FIELDS}
+
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+PERSONAL_TERMS = schema_terms(llm_service.schema) | SYNONYMS
+
+
+
+# (label, confidence) from the rules, or (None, 0) when they have nothing to go on
+def rule_classify(question):
+    text = question.lower()
+    words = re.findall(r"[a-z]+", text)
+    terms = [i for i, word in enumerate(words) if _stem(word) in PERSONAL_TERMS]
+
+    if terms:
+        # "my grades", "my dbms marks": the possessive owns the record
+        if any(word in ("my", "mine") for i in terms for word in words[max(0, i - 2):i]):
+            return True, 0.97
+        if SUBJECT.search(text):
+            return True, 0.93
+        if POSSESSIVE.search(text):
+            return True, 0.8
+        return None, 0
+
+    if not ANY_FIRST_PERSON.search(text):
+        return False, 0.95 if GENERAL_OPENER.search(text) else 0.85
+    return None, 0
+
+
+
+
+# online logistic regression over normalized query embeddings
+class EmbeddingClassifier:
+
+    def __init__(self, learning_rate=0.5, l2=1e-4, min_examples=CLASSIFIER_MIN_EXAMPLES):
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.min_examples = min_examples
+        self.weights = None
+        self.bias = 0.0
+        self.counts = [0, 0]
+        self._lock = threading.Lock()
+
+
+    @property
+    def ready(self):
+        return min(self.counts) >= self.min_examples
+
+
+    def _features(self, embedding):
+        x = np.asarray(embedding, dtype=np.float32)
+        return x / (np.linalg.norm(x) or 1.0)
+
+
+    def predict(self, embedding):
+        x = self._features(embedding)
+        with self._lock:
+            if self.weights is None:
+                return 0.5
+            return float(1 / (1 + np.exp(-(x @ self.weights + self.bias))))
+
+
+    def update(self, embedding, label):
+        x = self._features(embedding)
+        with self._lock:
+            if self.weights is None:
+                self.weights = np.zeros_like(x)
+            p = 1 / (1 + np.exp(-(x @ self.weights + self.bias)))
+            error = p - float(label)
+            self.weights -= self.learning_rate * (error * x + self.l2 * self.weights)
+            self.bias -= self.learning_rate * error
+            self.counts[int(label)] += 1
+
+
+model = EmbeddingClassifier()
+
+
+
+def _count(stage):
+    with _stats_lock:
+        stats[stage] += 1
+
+
+
+def _model_verdict(embedding):
+    p = model.predict(embedding)
+    if max(p, 1 - p) >= CLASSIFIER_CONFIDENCE:
+        return p >= 0.5
+    return None
+
+
+
+# learn from the LLM when the query embedding is already at hand (the
+# semantic cache search embeds every query anyway)
+def _learn(question, label, embedding=None):
+    if embedding is None:
+        embedding = memo.get(content_key(question))
+    if embedding is not None:
+        model.update(embedding, label)
+
+
+
+
+# Determine if a question is asking for personal information
+@metrics.timed("classify")
+def is_personal_query(question):
+    label, confidence = rule_classify(question)
+    if label is not None and confidence >= CLASSIFIER_CONFIDENCE:
+        _count("rules")
+        logger.info(f"Classification (rules): {label}")
+        return label
+
+    embedding = None
+    if model.ready:
+        embedding = embed_query(question)
+        label = _model_verdict(embedding)
+        if label is not None:
+            _count("model")
+            logger.info(f"Classification (embedding model): {label}")
+            return label
+
+    label = llm_service.is_personal_query(question)
+    _count("llm")
+    _learn(question, label, embedding)
+    return label
+
+
+
+@metrics.timed("classify")
+async def ais_personal_query(question):
+    label, confidence = rule_classify(question)
+    if label is not None and confidence >= CLASSIFIER_CONFIDENCE:
+        _count("rules")
+        logger.info(f"Classification (rules): {label}")
+        return label
+
+    embedding = None
+    if model.ready:
+        embedding = await aembed_query(question)
+        label = _model_verdict(embedding)
+        if label is not None:
+            _count("model")
+            logger.info(f"Classification (embedding model): {label}")
+            return label
+
+    label = await llm_service.ais_personal_query(question)
+    _count("llm")
+    _learn(question, label, embedding)
+    return label
+
+
+
+def classifier_stats():
+    with _stats_lock:
+        counts = dict(stats)
+    return {
+        **counts,
+        "llm_calls_avoided": counts["rules"] + counts["model"],
+        "confidence_threshold": CLASSIFIER_CONFIDENCE,
+        "model_examples": {"personal": model.counts[1], "general": model.counts[0]},
+    }
+
+
+
+def _collect():
+    with _stats_lock:
+        return [("edubot_classifier_decisions_total", "counter", {"stage": stage}, count)
+                for stage, count in stats.items()]
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,217 @@
+import os
+import atexit
+import asyncio
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from services import llm_service
+from services.metrics import timed
+from config import (EMBEDDING_MEMO_SIZE, EMBEDDING_MEMO_FILE, EMBEDDING_MEMO_SAVE_INTERVAL, EMBED_BATCH_WINDOW_MS,
+                    EMBED_BATCH_SIZE, logger)
+
+
+
+# embeddings are keyed on the model and the exact text
+def content_key(text):
+    model = getattr(llm_service.embeddings, "model", "")
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+
+
+# LRU of recently computed embeddings, optionally backed by a SQLite file so
+# the memo survives restarts. New embeddings are written to the file by a
+# background thread, at most once every `save_interval` seconds.
+class EmbeddingMemo:
+
+    def __init__(self, max_size=EMBEDDING_MEMO_SIZE, path=EMBEDDING_MEMO_FILE, save_interval=EMBEDDING_MEMO_SAVE_INTERVAL):
+        self.max_size = max_size
+        self.path = path
+        self.save_interval = save_interval
+        self._items = OrderedDict()
+        self._pending = {}                  # key -> vector not written to the file yet
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()    # the connection is shared by the request threads and the saver
+        self._db = None
+        self._saver = None
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+
+    # the embedding if it is held in memory, without reading the file
+    def get_recent(self, key):
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is None:
+                vector = self._pending.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+            return vector
+
+
+    def get(self, key):
+        vector = self.get_recent(key)
+        if vector is not None or self._db is None:
+            return vector
+        with self._db_lock:
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+        return vector
+
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is None:
+                return
+            self._pending[key] = vector
+
+        if self.save_interval > 0:
+            self._start_saver()
+        else:
+            self.save()
+
+
+    # writes the embeddings put since the last save in one transaction
+    def save(self):
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                                     [(key, vector.tobytes()) for key, vector in pending.items()])
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error saving embeddings: {e}")
+
+
+    def _run_saver(self):
+        while True:
+            time.sleep(self.save_interval)
+            self.save()
+
+
+    def _start_saver(self):
+        with self._lock:
+            if self._saver is not None:
+                return
+            self._saver = threading.Thread(target=self._run_saver, name="embedding-memo-saver", daemon=True)
+            self._saver.start()
+        atexit.register(self.save)
+
+
+    def _remember(self, key, vector):
+        self._items[key] = vector
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+
+
+# Groups embedding requests arriving within `window_ms` of each other into a
+# single embed_documents call. Callers get a Future for their own vector.
+class EmbeddingBatcher:
+
+    def __init__(self, embed_documents, window_ms=EMBED_BATCH_WINDOW_MS, max_batch=EMBED_BATCH_SIZE):
+        self.embed_documents = embed_documents
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+        return future
+
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._embed(batch)
+
+
+    def _embed(self, batch):
+        # callers that gave up while queued (e.g. a cancelled speculative lookup) are skipped
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if len(texts) > 1:
+            logger.info(f"Embedded a batch of {len(texts)} texts for {len(batch)} requests")
+        for text, future in batch:
+            future.set_result(np.asarray(vectors[text], dtype=np.float32))
+
+
+
+
+memo = EmbeddingMemo()
+batcher = EmbeddingBatcher(lambda texts: llm_service.embeddings.embed_documents(texts))
+
+
+
+# embedding of a single query, shared by every cache path
+@timed("embedding")
+def embed_query(text):
+    key = content_key(text)
+    vector = memo.get(key)
+    if vector is not None:
+        return vector
+
+    vector = batcher.submit(text).result()
+    memo.put(key, vector)
+    return vector
+
+
+
+# same as embed_query, but awaits the batcher instead of blocking a thread
+@timed("embedding")
+async def aembed_query(text):
+    key = content_key(text)
+    vector = memo.get_recent(key)
+    if vector is None and memo.path:
+        vector = await asyncio.to_thread(memo.get, key)
+    if vector is not None:
+        return vector
+
+    vector = await asyncio.wrap_future(batcher.submit(text))
+    memo.put(key, vector)
+    return vector
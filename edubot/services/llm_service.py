@@ -1,14 +1,54 @@
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence
+import re
+import threading
+from langchain_core.prompts import PromptTemplate
+from services.metrics import timed, record_usage
 from config import OPENAI_API_KEY, logger
 
 
-# initialize LLM models
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY)
+# The OpenAI models and the chains are built on first use rather than at
+# import: langchain_openai alone takes seconds to import, which used to delay
+# the server binding its port. `llm_service.llm`, `.embeddings` and the
+# `.<name>_chain` attributes still work through the module __getattr__ below.
+_singletons = {}
+_singletons_lock = threading.RLock()
 
-logger.info("OpenAI models initialized")
+
+
+def _singleton(key, factory):
+    value = _singletons.get(key)
+    if value is None:
+        with _singletons_lock:
+            value = _singletons.get(key)
+            if value is None:
+                value = _singletons[key] = factory()
+    return value
+
+
+
+def _create_llm():
+    from langchain_openai import ChatOpenAI
+    # stream_usage: streamed completions report their token counts too
+    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, openai_api_key=OPENAI_API_KEY, stream_usage=True)
+    logger.info("OpenAI chat model initialized")
+    return llm
+
+
+
+def _create_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    logger.info("OpenAI embeddings initialized")
+    return embeddings
+
+
+
+def get_llm():
+    return _singleton("llm", _create_llm)
+
+
+
+def get_embeddings():
+    return _singleton("embeddings", _create_embeddings)
 
 
 
@@ -124,41 +164,178 @@ Answer:
 
 
 
-# Create chains
-fallback_chain = fallback_prompt | llm
-query_chain = query_prompt | llm
-answer_chain = answer_prompt | llm
-classify_chain = classify_prompt | llm
+# collection -> field names, parsed from the SCHEMA block the prompts share
+def parse_schema(template):
+    return {
+        collection: re.findall(r"`(\w+)`", fields)
+        for collection, fields in re.findall(r"`(\w+)`\s*:\s*(.*)", template)
+    }
+
+
+schema = parse_schema(query_prompt.template)
+
+
+
+
+PROMPTS = {
+    "fallback": fallback_prompt,
+    "query": query_prompt,
+    "answer": answer_prompt,
+    "classify": classify_prompt,
+}
+
+
+
+# chains are built on first use, from whatever chat model is configured then
+def get_chain(name):
+    return _singleton(f"{name}_chain", lambda: PROMPTS[name] | get_llm())
+
+
+
+def __getattr__(name):
+    if name == "llm":
+        return get_llm()
+    if name == "embeddings":
+        return get_embeddings()
+    if name.endswith("_chain") and name[:-len("_chain")] in PROMPTS:
+        return get_chain(name[:-len("_chain")])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+# build the models and the chains now, e.g. in a warm-up thread after startup
+def load_models():
+    for name in PROMPTS:
+        get_chain(name)
+    get_embeddings()
+
+
+
+# swap in other models (e.g. offline fakes for benchmarks); chains are rebuilt on next use
+def configure_models(chat_model=None, embedding_model=None):
+    with _singletons_lock:
+        if embedding_model is not None:
+            _singletons["embeddings"] = embedding_model
+        if chat_model is not None:
+            _singletons["llm"] = chat_model
+            for name in PROMPTS:
+                _singletons.pop(f"{name}_chain", None)
 
 
 
 
 # Determine if a question is asking for personal information
+@timed("llm.classify")
 def is_personal_query(question):
-    classification = classify_chain.invoke({"question": question}).content.strip().lower()
+    response = get_chain("classify").invoke({"question": question})
+    record_usage("classify", response)
+    classification = response.content.strip().lower()
     logger.info(f"Classification: {classification}")
     return classification == "true"
 
 
 
 # Generate a MongoDB query from a natural language question
+@timed("llm.generate_query")
 def generate_mongo_query(question, email):
-    generated = query_chain.invoke({"question": question, "email": email})
+    generated = get_chain("query").invoke({"question": question, "email": email})
+    record_usage("generate_query", generated)
     return generated.content.strip()
 
 
 
 # Format MongoDB query results into a human-readable answer
+@timed("llm.format_answer")
 def format_query_response(question, result):
-    response = answer_chain.invoke({
+    response = get_chain("answer").invoke({
         "question": question,
         "result": result
     })
+    record_usage("format_answer", response)
     return response.content.strip()
 
 
 
 # Get a fallback response when no personal data is found
+@timed("llm.fallback")
 def get_fallback_response(question):
-    response = fallback_chain.invoke({"question": question})
+    response = get_chain("fallback").invoke({"question": question})
+    record_usage("fallback", response)
+    return response.content.strip()
+
+
+
+
+# Stream the answer token by token instead of waiting for the whole completion
+@timed("llm.format_answer_stream")
+def stream_query_response(question, result):
+    for chunk in get_chain("answer").stream({"question": question, "result": result}):
+        if chunk.content:
+            yield chunk.content
+        record_usage("format_answer", chunk)
+
+
+
+@timed("llm.fallback_stream")
+def stream_fallback_response(question):
+    for chunk in get_chain("fallback").stream({"question": question}):
+        if chunk.content:
+            yield chunk.content
+        record_usage("fallback", chunk)
+
+
+
+
+# async variants of the above, for the ASGI app
+@timed("llm.classify")
+async def ais_personal_query(question):
+    response = await get_chain("classify").ainvoke({"question": question})
+    record_usage("classify", response)
+    classification = response.content.strip().lower()
+    logger.info(f"Classification: {classification}")
+    return classification == "true"
+
+
+
+@timed("llm.generate_query")
+async def agenerate_mongo_query(question, email):
+    generated = await get_chain("query").ainvoke({"question": question, "email": email})
+    record_usage("generate_query", generated)
+    return generated.content.strip()
+
+
+
+@timed("llm.format_answer")
+async def aformat_query_response(question, result):
+    response = await get_chain("answer").ainvoke({
+        "question": question,
+        "result": result
+    })
+    record_usage("format_answer", response)
+    return response.content.strip()
+
+
+
+@timed("llm.fallback")
+async def aget_fallback_response(question):
+    response = await get_chain("fallback").ainvoke({"question": question})
+    record_usage("fallback", response)
     return response.content.strip()
+
+
+
+@timed("llm.format_answer_stream")
+async def astream_query_response(question, result):
+    async for chunk in get_chain("answer").astream({"question": question, "result": result}):
+        if chunk.content:
+            yield chunk.content
+        record_usage("format_answer", chunk)
+
+
+
+@timed("llm.fallback_stream")
+async def astream_fallback_response(question):
+    async for chunk in get_chain("fallback").astream({"question": question}):
+        if chunk.content:
+            yield chunk.content
+        record_usage("fallback", chunk)
@@ -0,0 +1,163 @@
+import time
+import inspect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from config import METRICS_WINDOW
+
+
+# Per-stage latency and a few counters, exported in the Prometheus text format.
+# prometheus_client's Summary has no quantiles in Python, so latencies are kept
+# in a sliding window per stage and p50/p95/p99 are computed when scraped.
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_timers = {}        # stage -> StageTimer
+_counters = {}      # (name, sorted label items) -> value
+_collectors = []
+_lock = threading.Lock()
+
+
+
+class StageTimer:
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.sum += seconds
+
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+
+
+def observe(stage, seconds):
+    with _lock:
+        timer = _timers.get(stage)
+        if timer is None:
+            timer = _timers[stage] = StageTimer()
+        timer.observe(seconds)
+
+
+
+def inc(name, amount=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+
+# Times every call of the decorated function under `stage`. Generators are
+# timed until they are exhausted (or closed), not just until they are created.
+def timed(stage):
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    async for item in fn(*args, **kwargs):
+                        yield item
+                finally:
+                    observe(stage, time.perf_counter() - start)
+
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with timer(stage):
+                    yield from fn(*args, **kwargs)
+
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return await fn(*args, **kwargs)
+
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return fn(*args, **kwargs)
+
+        return wrapper
+    return decorate
+
+
+
+# token counts reported by the OpenAI API for one completion (or stream chunk)
+def record_usage(stage, message):
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        inc("edubot_llm_tokens_total", usage.get("input_tokens", 0), stage=stage, kind="input")
+        inc("edubot_llm_tokens_total", usage.get("output_tokens", 0), stage=stage, kind="output")
+
+
+
+# `collector()` returns (name, type, labels, value) samples computed at scrape
+# time, for state the services already keep (classifier, plan and result caches)
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+
+
+# label values escape backslashes, double quotes and newlines
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+
+def _labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+
+def render():
+    lines = ["# TYPE edubot_stage_seconds summary"]
+    with _lock:
+        timers = sorted(_timers.items())
+        counters = sorted(_counters.items())
+
+    for stage, stage_timer in timers:
+        for q, value in stage_timer.quantiles().items():
+            lines.append(f'edubot_stage_seconds{_labels([("stage", stage), ("quantile", q)])} {value:.6f}')
+        lines.append(f'edubot_stage_seconds_sum{_labels([("stage", stage)])} {stage_timer.sum:.6f}')
+        lines.append(f'edubot_stage_seconds_count{_labels([("stage", stage)])} {stage_timer.count}')
+
+    samples = [(name, "counter", labels, value) for (name, labels), value in counters]
+    for collector in _collectors:
+        samples.extend((name, kind, tuple(sorted(labels.items())), value)
+                       for name, kind, labels, value in collector())
+
+    typed = set()
+    for name, kind, labels, value in sorted(samples, key=lambda sample: sample[0]):
+        if name not in typed:
+            lines.append(f"# TYPE {name} {kind}")
+            typed.add(name)
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
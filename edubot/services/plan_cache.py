@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from services.llm_service import query_prompt
+from services import metrics
+from utils import normalize_question
+from config import PLAN_CACHE_FILE, PLAN_CACHE_SIZE, PLAN_CACHE_SAVE_INTERVAL, logger
+
+
+# Parsed pipelines from generate_mongo_query, stored as templates with the
+# student's email swapped for a placeholder. Another student asking the same
+# question gets the template bound to their own email instead of a new LLM
+# call. Plans are keyed on the prompt text too, so editing the prompt or the
+# schema in it invalidates them. New plans are saved to disk in the
+# background, at most once every PLAN_CACHE_SAVE_INTERVAL seconds.
+
+EMAIL_PLACEHOLDER = "{{email}}"
+
+# ids like "65f1c2..." or {"$oid": ...} tie a pipeline to one user's documents
+OBJECT_ID = re.compile(r"^[0-9a-fA-F]{24}$")
+
+PROMPT_VERSION = hashlib.sha256(query_prompt.template.encode("utf-8")).hexdigest()[:16]
+
+stats = {"hits": 0, "misses": 0}
+
+
+
+def plan_key(question, email):
+    return normalize_question(question.replace(email, "email"))
+
+
+
+# the pipeline refers to one user's documents by id, so it can't be shared
+class UserSpecificPlan(Exception):
+    pass
+
+
+
+# copy of the pipeline with the email replaced; `found` counts the replacements
+def _abstract(node, email, found):
+    if isinstance(node, str):
+        if OBJECT_ID.match(node):
+            raise UserSpecificPlan(node)
+        found[0] += node.count(email)
+        return node.replace(email, EMAIL_PLACEHOLDER)
+    if isinstance(node, list):
+        return [_abstract(item, email, found) for item in node]
+    if isinstance(node, dict):
+        if "$oid" in node:
+            raise UserSpecificPlan(node)
+        return {key: _abstract(value, email, found) for key, value in node.items()}
+    return node
+
+
+
+def _bind(node, email):
+    if isinstance(node, str):
+        return node.replace(EMAIL_PLACEHOLDER, email)
+    if isinstance(node, list):
+        return [_bind(item, email) for item in node]
+    if isinstance(node, dict):
+        return {key: _bind(value, email) for key, value in node.items()}
+    return node
+
+
+
+
+class PlanCache:
+
+    def __init__(self, path=PLAN_CACHE_FILE, max_size=PLAN_CACHE_SIZE, save_interval=PLAN_CACHE_SAVE_INTERVAL):
+        self.path = path
+        self.max_size = max_size
+        self.save_interval = save_interval
+        self.plans = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()     # one write of the file at a time
+        self._dirty = False
+        self._saver = None
+        self._load()
+
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading plan cache: {e}")
+            return
+
+        if saved.get("version") != PROMPT_VERSION:
+            logger.info("Query prompt changed, discarding cached query plans")
+            return
+        self.plans.update(saved.get("plans", {}))
+
+
+    # writes the plans if any changed since the last save; the file is
+    # replaced whole, through a temporary file of this process
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps({"version": PROMPT_VERSION, "plans": self.plans})
+                self._dirty = False
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.error(f"Error saving plan cache: {e}")
+                with self._lock:
+                    self._dirty = True
+
+
+    def _run_saver(self):
+        while True:
+            time.sleep(self.save_interval)
+            self.save()
+
+
+    def _start_saver(self):
+        with self._lock:
+            if self._saver is not None:
+                return
+            self._saver = threading.Thread(target=self._run_saver, name="plan-cache-saver", daemon=True)
+            self._saver.start()
+        atexit.register(self.save)
+
+
+    def get(self, question, email):
+        key = plan_key(question, email)
+        with self._lock:
+            template = self.plans.get(key)
+            if template is None:
+                stats["misses"] += 1
+                return None
+            self.plans.move_to_end(key)
+            stats["hits"] += 1
+
+        logger.info(f"Reusing cached query plan for: {key}")
+        return _bind(template, email)
+
+
+    def put(self, question, email, pipeline):
+        found = [0]
+        try:
+            template = _abstract(pipeline, email, found)
+        except UserSpecificPlan:
+            return False
+        if not found[0]:
+            return False
+
+        with self._lock:
+            self.plans[plan_key(question, email)] = template
+            self.plans.move_to_end(plan_key(question, email))
+            while len(self.plans) > self.max_size:
+                self.plans.popitem(last=False)
+            self._dirty = True
+
+        if self.save_interval > 0:
+            self._start_saver()
+        else:
+            self.save()
+        return True
+
+
+plans = PlanCache()
+metrics.register_collector(lambda: [
+    ("edubot_plan_cache_lookups_total", "counter", {"result": "hit"}, stats["hits"]),
+    ("edubot_plan_cache_lookups_total", "counter", {"result": "miss"}, stats["misses"]),
+])
@@ -1,9 +1,21 @@
 import json
 import ast
-from db import all_collections
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from db import COLLECTION_NAMES, get_collections, get_async_collections, explain_pipeline
+from services.llm_service import schema
+from services.metrics import timed
 from config import logger
 
 
+# fans a pipeline out over several collections when routing can't narrow it down
+executor = ThreadPoolExecutor(max_workers=len(COLLECTION_NAMES), thread_name_prefix="mongo")
+
+# stages that keep the documents' own fields visible to a later $match
+PASSTHROUGH_STAGES = {"$sort", "$limit", "$skip", "$unwind", "$sample"}
+
+
+
 # convert MongoDB query string into a python object
 def parse_mongo_query(query_string):
     try:
@@ -14,16 +26,144 @@ def parse_mongo_query(query_string):
 
 
 
+# top-level fields a document needs to pass a $match filter,
+# or None if the filter can't be analysed (e.g. $expr)
+def _match_fields(condition):
+    fields = set()
+    for key, value in condition.items():
+        if key in ("$and", "$or"):
+            clauses = [_match_fields(clause) for clause in value]
+            if any(clause is None for clause in clauses):
+                return None
+            if clauses:
+                # every $and clause must hold, but only fields shared by all $or branches are certain
+                fields |= set.union(*clauses) if key == "$and" else set.intersection(*clauses)
+        elif key == "$nor":
+            continue
+        elif key.startswith("$"):
+            return None
+        elif not _matches_missing(value):
+            fields.add(key.split(".")[0])
+    return fields
+
+
+
+# conditions such as null, $exists: false or $ne also match documents without the field
+def _matches_missing(value):
+    if value is None:
+        return True
+    if not isinstance(value, dict):
+        return False
+    return (
+        value.get("$exists", True) is False
+        or any(op in value for op in ("$ne", "$nin", "$not"))
+        or value.get("$eq", 0) is None
+        or None in value.get("$in", [])
+    )
+
+
+
+# Collections whose schema has every field the pipeline filters or joins on
+# before reshaping its documents. Returns None when the pipeline gives no
+# usable hint, in which case every collection has to be tried.
+def route_pipeline(pipeline):
+    required, derived = set(), set()
+
+    for stage in pipeline:
+        if "$match" in stage:
+            fields = _match_fields(stage["$match"])
+            if fields is None:
+                break
+            required |= fields - derived
+        elif "$lookup" in stage:
+            lookup = stage["$lookup"]
+            if "localField" in lookup and lookup["localField"].split(".")[0] not in derived:
+                required.add(lookup["localField"].split(".")[0])
+            derived.add(lookup.get("as", ""))
+        elif "$addFields" in stage or "$set" in stage:
+            derived |= set(stage.get("$addFields", stage.get("$set", {})))
+        elif not PASSTHROUGH_STAGES.intersection(stage):
+            break
+
+    required.discard("_id")
+    if not required:
+        return None
+
+    targets = [name for name, fields in schema.items() if required <= set(fields)]
+    return targets or None
+
+
+
+def _route(pipeline, collections):
+    targets = route_pipeline(pipeline)
+    if targets is None:
+        logger.info(f"Could not route pipeline, querying all {len(collections)} collections")
+        return collections
+
+    logger.info(f"Routing pipeline to {targets}")
+    return [collection for collection in collections if collection.name in targets]
+
+
+
+
+def _aggregate(collection, mongo_query):
+    try:
+        return list(collection.aggregate(mongo_query))
+    except Exception as e:
+        logger.error(f"Error executing query on collection {collection.name}: {e}")
+        return []
+
+
+
+@timed("mongo.aggregate")
 def execute_mongo_query(mongo_query):
+    collections = _route(mongo_query, get_collections())
+
+    if len(collections) == 1:
+        return _aggregate(collections[0], mongo_query)
+
     all_results = []
-    
-    for collection in all_collections:
-        try:
-            results = list(collection.aggregate(mongo_query))
-            if results:
-                all_results.extend(results)
-        except Exception as e:
-            logger.error(f"Error executing query on collection {collection.name}: {e}")
-            continue
-    
-    return all_results
\ No newline at end of file
+    for results in executor.map(lambda collection: _aggregate(collection, mongo_query), collections):
+        all_results.extend(results)
+
+    return all_results
+
+
+
+
+async def _aaggregate(collection, mongo_query):
+    try:
+        cursor = await collection.aggregate(mongo_query)
+        return await cursor.to_list()
+    except Exception as e:
+        logger.error(f"Error executing query on collection {collection.name}: {e}")
+        return []
+
+
+
+@timed("mongo.aggregate")
+async def aexecute_mongo_query(mongo_query):
+    collections = _route(mongo_query, get_async_collections())
+
+    all_results = []
+    for results in await asyncio.gather(*(_aaggregate(collection, mongo_query) for collection in collections)):
+        all_results.extend(results)
+
+    return all_results
+
+
+
+
+# explain each pipeline on the collections it routes to and flag collection scans
+def collscan_report(pipelines):
+    report = []
+    for pipeline in pipelines:
+        for collection in _route(pipeline, get_collections()):
+            entry = {"collection": collection.name, "pipeline": pipeline}
+            try:
+                entry["stages"] = explain_pipeline(collection, pipeline)
+                entry["collscan"] = "COLLSCAN" in entry["stages"]
+            except Exception as e:
+                entry["error"] = str(e)
+            report.append(entry)
+    return report
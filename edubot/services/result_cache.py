@@ -0,0 +1,212 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+import db
+from services import metrics
+from utils import normalize_question
+from config import RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_WATCH, logger
+
+
+# Results of personal queries, keyed by student email and pipeline, plus the
+# formatted answers given for them. Entries live for RESULT_CACHE_TTL seconds
+# and are dropped as soon as a change stream reports a write to one of the
+# student's records, so repeat questions never serve stale grades.
+
+WATCHED_COLLECTIONS = ["marks", "attendances", "assignmentsubmissions", "professorremarks", "users"]
+
+# fields in the watched collections that point at the student
+STUDENT_FIELDS = ["studentId", "uploader"]
+
+
+
+def pipeline_key(pipeline):
+    return json.dumps(pipeline, sort_keys=True, default=str)
+
+
+
+
+class ResultCache:
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_SIZE, watch=RESULT_CACHE_WATCH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.watch = watch
+        self.entries = OrderedDict()    # (email, pipeline key) -> {"expires", "results", "answers"}
+        self.by_email = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.epoch = 0                  # bumped by clear()
+        self.generations = {}           # email -> bumped by invalidate_email()
+        self._lock = threading.Lock()
+        self._watcher = None
+
+
+    def _entry(self, email, pipeline):
+        key = (email, pipeline_key(pipeline))
+        entry = self.entries.get(key)
+        if entry is None:
+            return key, None
+        if entry["expires"] < time.time():
+            self._drop(key)
+            return key, None
+        self.entries.move_to_end(key)
+        return key, entry
+
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        keys = self.by_email.get(key[0])
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self.by_email[key[0]]
+
+
+    def get_answer(self, email, pipeline, question):
+        with self._lock:
+            _, entry = self._entry(email, pipeline)
+            answer = entry["answers"].get(normalize_question(question)) if entry else None
+            if answer is not None:
+                self.hits += 1
+            return answer
+
+
+    # serialized results, or None on a miss
+    def get_results(self, email, pipeline):
+        with self._lock:
+            _, entry = self._entry(email, pipeline)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["results"]
+
+
+    # Taken before reading a student's records: put_results() drops results
+    # read while a change to them was being reported, which would otherwise
+    # be cached for the whole TTL.
+    def generation(self, email):
+        self._start_watcher()
+        with self._lock:
+            return self.epoch, self.generations.get(email, 0)
+
+
+    def put_results(self, email, pipeline, results, generation=None):
+        self._start_watcher()
+        with self._lock:
+            if generation is not None and generation != (self.epoch, self.generations.get(email, 0)):
+                return
+            key = (email, pipeline_key(pipeline))
+            self.entries[key] = {"expires": time.time() + self.ttl, "results": results, "answers": {}}
+            self.entries.move_to_end(key)
+            self.by_email.setdefault(email, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+
+    def put_answer(self, email, pipeline, question, answer):
+        with self._lock:
+            _, entry = self._entry(email, pipeline)
+            if entry is not None:
+                entry["answers"][normalize_question(question)] = answer
+
+
+    def invalidate_email(self, email):
+        with self._lock:
+            self.generations[email] = self.generations.get(email, 0) + 1
+            keys = self.by_email.pop(email, set())
+            for key in keys:
+                self.entries.pop(key, None)
+            self.invalidations += len(keys)
+
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self.entries)
+            self.epoch += 1
+            self.generations.clear()
+            self.entries.clear()
+            self.by_email.clear()
+
+
+    def _start_watcher(self):
+        if not self.watch or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_changes, name="result-cache-watcher", daemon=True)
+                self._watcher.start()
+
+
+    def _email_for(self, change):
+        if change.get("ns", {}).get("coll") == "users":
+            document = change.get("fullDocument") or {}
+            return document.get("email")
+
+        document = change.get("fullDocument") or {}
+        for field in STUDENT_FIELDS:
+            student = document.get(field)
+            if student is None:
+                continue
+            ids = [student]
+            if isinstance(student, str) and ObjectId.is_valid(student):
+                ids.append(ObjectId(student))
+            user = db.get_db()["users"].find_one({"_id": {"$in": ids}}, {"email": 1})
+            if user:
+                return user.get("email")
+        return None
+
+
+    # Follows writes to the watched collections; change streams need a
+    # replica set (Atlas is one), elsewhere entries simply expire by TTL.
+    # Dropping or renaming the database invalidates the stream: everything
+    # is cleared and a new stream opened.
+    def _watch_changes(self):
+        match = [{"$match": {"$or": [{"ns.coll": {"$in": WATCHED_COLLECTIONS}}, {"operationType": "invalidate"}]}}]
+        backoff = 1
+        while True:
+            try:
+                with db.get_db().watch(match, full_document="updateLookup") as stream:
+                    logger.info("Watching MongoDB changes to invalidate cached personal results")
+                    backoff = 1
+                    for change in stream:
+                        if change.get("operationType") == "invalidate":
+                            logger.warning("Change stream invalidated, clearing cached personal results")
+                            self.clear()
+                            break
+                        email = self._email_for(change)
+                        if email:
+                            self.invalidate_email(email)
+                        else:
+                            # deletes and unknown owners: can't tell whose results changed
+                            self.clear()
+            except OperationFailure as e:
+                logger.warning(f"Change streams unavailable, personal results expire by TTL only: {e}")
+                return
+            except PyMongoError as e:
+                logger.error(f"Change stream interrupted, retrying in {backoff}s: {e}")
+                self.clear()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            except Exception as e:
+                logger.error(f"Stopped watching MongoDB changes, personal results expire by TTL only: {e}")
+                return
+
+
+results_cache = ResultCache()
+
+
+def _collect():
+    return [
+        ("edubot_result_cache_lookups_total", "counter", {"result": "hit"}, results_cache.hits),
+        ("edubot_result_cache_lookups_total", "counter", {"result": "miss"}, results_cache.misses),
+        ("edubot_result_cache_invalidations_total", "counter", {}, results_cache.invalidations),
+        ("edubot_result_cache_entries", "gauge", {}, len(results_cache.entries)),
+    ]
+
+
+metrics.register_collector(_collect)
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from config import logger
+
+
+# Collapses concurrent calls for the same key into one: the first caller runs
+# the function, the ones arriving while it is in flight wait for its result
+# (or its exception). Nothing is kept once the call has finished.
+class SingleFlight:
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._futures = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.info(f"{self.name}: joined in-flight call for {key[:50]}")
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+
+    # Same for coroutines on one event loop. The shared task is shielded, so
+    # a caller that goes away does not cancel it for the others.
+    async def ado(self, key, fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+        else:
+            self.shared += 1
+            logger.info(f"{self.name}: joined in-flight call for {key[:50]}")
+        return await asyncio.shield(task)
+
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # mark the exception retrieved even if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,80 @@
+from array import array
+import numpy as np
+from config import TOPIC_MAX_CANDIDATES
+
+
+# length of the character n-grams topics are indexed by
+GRAM = 3
+
+
+
+# distinct character n-grams of a topic: a topic inside another has all its n-grams in the other one
+def topic_grams(topic):
+    return {topic[i:i + GRAM] for i in range(len(topic) - GRAM + 1)}
+
+
+
+
+# Index of the cache entries by topic. search_similar keeps a match when one
+# topic is a substring of the other ("cell" / "cellular respiration"), and
+# the candidates are exactly the entries that rule keeps:
+#   - topics inside the query topic are looked up among its substrings
+#   - topics containing it are found through an inverted index from character
+#     n-grams to the distinct topics having them, then checked
+# Entries sharing a topic are listed under it once. Dead ids stay listed
+# until the next rebuild, like the rows of the similarity index.
+class TopicIndex:
+
+    def __init__(self, max_candidates=TOPIC_MAX_CANDIDATES):
+        self.max_candidates = max_candidates
+        self.ids = {}           # topic -> ids of the entries on it
+        self.postings = {}      # n-gram -> topics having it
+        self.max_length = 0     # of any topic, bounds the substrings looked up
+        self.size = 0
+
+
+    def __len__(self):
+        return self.size
+
+
+    def rebuild(self, topics, live):
+        self.ids, self.postings, self.max_length, self.size = {}, {}, 0, 0
+        for idx, topic in enumerate(topics):
+            self.add(idx, topic if live[idx] else None)
+
+
+    def add(self, idx, topic):
+        self.size = max(self.size, idx + 1)
+        if topic is None:
+            return
+        ids = self.ids.get(topic)
+        if ids is None:
+            ids = self.ids[topic] = array("q")
+            self.max_length = max(self.max_length, len(topic))
+            for gram in topic_grams(topic):
+                self.postings.setdefault(gram, set()).add(topic)
+        ids.append(idx)
+
+
+    # Sorted ids worth scoring for `topic`, or None when a full search is the
+    # better plan: the topic is shorter than an n-gram, or the candidates are such
+    # a large share of the cache that gathering their rows costs more than
+    # scanning all of them.
+    def candidates(self, topic):
+        grams = topic_grams(topic)
+        if not grams:
+            return None
+
+        matches = {topic[i:j] for i in range(len(topic) + 1)
+                   for j in range(i, min(len(topic), i + self.max_length) + 1)} & self.ids.keys()
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        if postings[0]:
+            matches.update(cached for cached in postings[0].intersection(*postings[1:]) if topic in cached)
+
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        if sum(len(self.ids[cached]) for cached in matches) > self.max_candidates * len(self):
+            return None
+        ids = np.concatenate([np.frombuffer(self.ids[cached], dtype=np.int64) for cached in matches])
+        ids.sort()
+        return ids
@@ -0,0 +1,295 @@
+import time
+import numpy as np
+from config import ANN_MIN_SIZE, ANN_NPROBE, logger
+
+
+
+# unit-normalize vectors so that a dot product is the cosine similarity
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+
+
+# float32 matrix of normalized rows: an optional read-only base segment (e.g. a
+# memory-mapped file, used zero-copy) followed by an in-memory tail with
+# amortized O(1) appends
+class EmbeddingMatrix:
+
+    def __init__(self, base=None, capacity=1024):
+        self._base = base
+        self.dim = None if base is None else base.shape[1]
+        self._capacity = capacity
+        self._data = None
+        self._size = 0
+
+
+    def __len__(self):
+        return self._base_size + self._size
+
+
+    @property
+    def tail_size(self):
+        return self._size
+
+
+    @property
+    def _base_size(self):
+        return 0 if self._base is None else len(self._base)
+
+
+    def _reserve(self, rows):
+        if self._data is None:
+            self._data = np.empty((max(self._capacity, rows), self.dim), dtype=np.float32)
+        elif self._size + rows > len(self._data):
+            grown = np.empty((max(len(self._data) * 2, self._size + rows), self.dim), dtype=np.float32)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+
+    def extend(self, vectors):
+        vectors = normalize(vectors)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding has dimension {vectors.shape[1]}, expected {self.dim}")
+
+        self._reserve(len(vectors))
+        start = len(self)
+        self._data[self._size:self._size + len(vectors)] = vectors
+        self._size += len(vectors)
+        return start
+
+
+    def append(self, vector):
+        return self.extend(vector)
+
+
+    def _tail(self):
+        if self._data is None:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return self._data[:self._size]
+
+
+    # rows [start, stop) as one array; only copies when the range spans both segments
+    def block(self, start, stop):
+        base_size = self._base_size
+        if stop <= base_size:
+            return self._base[start:stop]
+        if start >= base_size:
+            return self._tail()[start - base_size:stop - base_size]
+        return np.concatenate([self._base[start:], self._tail()[:stop - base_size]])
+
+
+    def take(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        base_size = self._base_size
+        if not base_size:
+            return self._tail()[ids]
+        if self._size == 0:
+            return self._base[ids]
+
+        rows = np.empty((len(ids), self.dim), dtype=np.float32)
+        in_base = ids < base_size
+        rows[in_base] = self._base[ids[in_base]]
+        rows[~in_base] = self._tail()[ids[~in_base] - base_size]
+        return rows
+
+
+    def dot(self, query):
+        if self._base is None:
+            return self._tail() @ query
+        return np.concatenate([self._base @ query, self._tail() @ query])
+
+
+
+
+# inverted-file index: rows are bucketed under their nearest k-means centroid
+# and a search only scores the buckets of the `nprobe` closest centroids
+class IVFIndex:
+
+    def __init__(self, nlist, nprobe=ANN_NPROBE, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self._lists = []
+        self._arrays = []
+        self._size = 0
+        self.trained_size = 0
+
+
+    def __len__(self):
+        return self._size
+
+
+    # spherical k-means over a sample of the rows
+    def train(self, matrix):
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), self.nlist * 32)
+        sample = matrix.take(np.sort(rng.choice(len(matrix), sample_size, replace=False)))
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+
+        self.centroids = centroids
+        self._lists = [[] for _ in range(self.nlist)]
+        self._arrays = [None] * self.nlist
+        self._size = 0
+        self.trained_size = len(matrix)
+
+
+    def add(self, matrix, start=0):
+        stop = len(matrix)
+        if start >= stop:
+            return
+
+        # assign in blocks so the rows x centroids score matrix stays small
+        assignment = np.concatenate([
+            np.argmax(matrix.block(i, min(i + 16384, stop)) @ self.centroids.T, axis=1)
+            for i in range(start, stop, 16384)
+        ])
+        order = np.argsort(assignment, kind="stable") + start
+        counts = np.bincount(assignment, minlength=self.nlist)
+        for bucket, members in enumerate(np.split(order, np.cumsum(counts)[:-1])):
+            if len(members):
+                self._lists[bucket].extend(members.tolist())
+                self._arrays[bucket] = None
+        self._size = stop
+
+
+    def _bucket(self, bucket):
+        if self._arrays[bucket] is None:
+            self._arrays[bucket] = np.asarray(self._lists[bucket], dtype=np.int64)
+        return self._arrays[bucket]
+
+
+    def candidates(self, query):
+        probes = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+        return np.concatenate([self._bucket(b) for b in probes])
+
+
+
+
+# similarity index over the cached question embeddings. Small caches are
+# searched exactly with one matrix-vector product; once the cache reaches
+# `ann_min_size` rows an IVF index narrows the rows that get scored
+class VectorIndex:
+
+    def __init__(self, ann_min_size=ANN_MIN_SIZE, nprobe=ANN_NPROBE):
+        self.ann_min_size = ann_min_size
+        self.nprobe = nprobe
+        self.matrix = EmbeddingMatrix()
+        self._ivf = None
+
+
+    def __len__(self):
+        return len(self.matrix)
+
+
+    def rebuild(self, vectors):
+        self.matrix = EmbeddingMatrix()
+        self._ivf = None
+        if len(vectors):
+            self.matrix.extend(vectors)
+        self._sync_ann()
+
+
+    # index already-normalized rows in place, without copying them
+    def attach(self, base):
+        self.matrix = EmbeddingMatrix(base=base)
+        self._ivf = None
+        self._sync_ann()
+
+
+    # swap in a longer mapping of the same rows, keeping the trained IVF lists
+    def remap(self, base):
+        self.matrix = EmbeddingMatrix(base=base)
+        self._sync_ann()
+
+
+    def add(self, vector):
+        idx = self.matrix.append(vector)
+        self._sync_ann()
+        return idx
+
+
+    # (re)train the IVF index whenever the cache has doubled since the last training
+    def _sync_ann(self):
+        size = len(self.matrix)
+        if size < self.ann_min_size:
+            self._ivf = None
+            return
+
+        if self._ivf is None or size >= 2 * self._ivf.trained_size:
+            nlist = max(1, int(np.sqrt(size)))
+            logger.info(f"Training IVF index with {nlist} lists over {size} embeddings")
+            self._ivf = IVFIndex(nlist, nprobe=self.nprobe)
+            self._ivf.train(self.matrix)
+            self._ivf.add(self.matrix)
+        elif len(self._ivf) < size:
+            self._ivf.add(self.matrix, start=len(self._ivf))
+
+
+    # ids and scores of rows scoring at least `min_score`, best first; `ids`
+    # restricts the search to those rows (e.g. the candidates of a topic)
+    def search(self, query, k=None, min_score=None, exact=False, ids=None):
+        if not len(self.matrix) or (ids is not None and not len(ids)):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = normalize(query).reshape(-1)
+        if ids is not None:
+            scores = self.matrix.take(ids) @ query
+        elif self._ivf is None or exact:
+            ids = None
+            scores = self.matrix.dot(query)
+        else:
+            ids = self._ivf.candidates(query)
+            scores = self.matrix.take(ids) @ query
+
+        if min_score is not None:
+            keep = np.flatnonzero(scores >= min_score)
+        else:
+            keep = np.arange(len(scores))
+
+        if k is not None and len(keep) > k:
+            keep = keep[np.argpartition(scores[keep], -k)[-k:]]
+        keep = keep[np.argsort(scores[keep])[::-1]]
+
+        return (keep if ids is None else ids[keep]), scores[keep]
+
+
+
+
+# recall@k and per-query latency of the ANN path against exact search
+def evaluate_index(index, queries, k=10):
+    recalls, exact_times, ann_times = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact_ids, _ = index.search(query, k=k, exact=True)
+        exact_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ann_ids, _ = index.search(query, k=k)
+        ann_times.append(time.perf_counter() - start)
+
+        recalls.append(len(set(exact_ids.tolist()) & set(ann_ids.tolist())) / max(1, len(exact_ids)))
+
+    return {
+        "size": len(index),
+        "recall_at_k": float(np.mean(recalls)),
+        "exact_ms": 1000 * float(np.mean(exact_times)),
+        "ann_ms": 1000 * float(np.mean(ann_times)),
+    }
@@ -0,0 +1,34 @@
+import time
+import threading
+from services import llm_service, cache_service
+from db import get_db, ensure_indexes
+from config import MONGO_ENSURE_INDEXES, WARM_UP, logger
+
+
+
+def _step(name, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+        logger.info(f"Warmed up {name} in {1000 * (time.perf_counter() - start):.0f} ms")
+    except Exception as e:
+        logger.error(f"Could not warm up {name}: {e}")
+
+
+
+# Everything the first /ask would otherwise build on demand. It runs after the
+# app is created, so the port is bound and health checks pass in the meantime.
+def warm_up():
+    if MONGO_ENSURE_INDEXES:
+        _step("MongoDB indexes", ensure_indexes)
+    if WARM_UP:
+        _step("MongoDB client", get_db)
+        _step("OpenAI models", llm_service.load_models)
+        _step("answer cache", cache_service.load)
+
+
+
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the services import their siblings and config the way app.py runs them: from the edubot directory
+EDUBOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, EDUBOT_DIR)
+os.chdir(EDUBOT_DIR)
+os.makedirs("logs", exist_ok=True)     # config logs to ./logs/chatbot.log
@@ -0,0 +1,62 @@
+import time
+import asyncio
+import threading
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from services import cache_service
+from async_routes import register_async_routes
+
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    register_async_routes(app)
+    return TestClient(app)
+
+
+
+@pytest.mark.parametrize("path", ["/ask", "/ask/stream"])
+@pytest.mark.parametrize("body", ["{not json", "[1, 2]", ""])
+def test_malformed_bodies_are_rejected(client, path, body):
+    response = client.post(path, content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+
+@pytest.fixture
+def empty_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_service, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache_service, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(cache_service, "_loaded", False)
+    cache_service.load()
+    yield cache_service
+    cache_service.store.close()
+
+
+
+# a writer holding the store lock must not stall the event loop
+def test_exact_lookup_waits_for_the_store_lock_off_the_event_loop(empty_cache):
+    held = threading.Event()
+
+    def writer():
+        with empty_cache.store.lock:
+            held.set()
+            time.sleep(0.3)
+
+    async def main():
+        thread = threading.Thread(target=writer)
+        thread.start()
+        held.wait()
+        lookup = asyncio.create_task(empty_cache.aget_exact_match("what is dna"))
+        ticks = 0
+        while not lookup.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        thread.join()
+        return await lookup, ticks
+
+    answer, ticks = asyncio.run(main())
+    assert answer is None
+    assert ticks >= 10
@@ -0,0 +1,83 @@
+import time
+import pytest
+from services.cache_policy import CachePolicy
+
+
+
+def policy(**kwargs):
+    options = {"max_entries": 10 ** 6, "max_bytes": 10 ** 9, "eviction": "lru", "ttl": 0}
+    options.update(kwargs)
+    return CachePolicy(**options)
+
+
+
+def test_nothing_is_evicted_within_budget():
+    cache = policy(max_entries=5)
+    for idx in range(5):
+        cache.track(idx, 10)
+    assert cache.victims() == []
+
+
+
+def test_lru_evicts_the_least_recently_used_down_to_the_low_watermark():
+    cache = policy(max_entries=10)
+    now = time.time()
+    for idx in range(11):
+        cache.track(idx, 10, created=now - 100 + idx)
+    cache.touch(0)
+    cache.touch(1)
+    # 11 entries over a budget of 10: evict down to 9
+    assert cache.victims() == [2, 3]
+    assert cache.evictions == 2
+
+
+
+def test_lfu_evicts_the_least_hit_first():
+    cache = policy(max_entries=4, eviction="lfu")
+    now = time.time()
+    for idx in range(5):
+        cache.track(idx, 10, created=now - 100 + idx)
+    for idx in (0, 0, 1, 3, 4):
+        cache.touch(idx)
+    victims = cache.victims()
+    assert victims == [2, 1]
+
+
+
+def test_byte_budget():
+    cache = policy(max_bytes=1000)
+    now = time.time()
+    for idx in range(6):
+        cache.track(idx, 200, created=now - 100 + idx)
+    assert cache.total_bytes == 1200
+    # down to 900 bytes
+    assert cache.victims() == [0, 1]
+
+
+
+def test_expired_entries_go_first_and_count_towards_the_budget():
+    cache = policy(max_entries=3, ttl=60)
+    now = time.time()
+    for idx in range(4):
+        cache.track(idx, 10, created=now - 120 if idx < 2 else now)
+    assert cache.is_expired(0) and not cache.is_expired(2)
+    # two expired, leaving two live entries within the budget
+    assert cache.victims() == [0, 1]
+    assert cache.expirations == 2 and cache.evictions == 0
+
+
+
+def test_forget_and_remap_keep_the_byte_count():
+    cache = policy()
+    for idx in range(4):
+        cache.track(idx, 10 * (idx + 1))
+    cache.forget(1)
+    assert cache.total_bytes == 80
+    cache.remap([0, -1, 1, 2])
+    assert sorted(cache.meta) == [0, 1, 2] and cache.total_bytes == 80
+
+
+
+def test_unknown_eviction_policy():
+    with pytest.raises(ValueError):
+        policy(eviction="fifo")
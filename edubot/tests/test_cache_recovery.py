@@ -0,0 +1,31 @@
+import json
+import numpy as np
+from services import cache_service
+from services.cache_store import CacheStore
+
+
+
+def test_corrupt_legacy_cache_starts_empty(tmp_path, monkeypatch):
+    legacy = tmp_path / "cache.json"
+    legacy.write_text('{"questions": ["what is', encoding="utf-8")
+    monkeypatch.setattr(cache_service, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache_service, "CACHE_FILE", str(legacy))
+
+    store = cache_service.load_cache()
+    assert len(store) == 0
+    store.close()
+
+
+
+def test_unreadable_store_starts_a_new_generation(tmp_path):
+    store = CacheStore(str(tmp_path), fsync=False, flush_interval_ms=0).open()
+    store.extend([("what is dna", "a molecule", np.ones(4, dtype=np.float32))])
+    store.close()
+    with open(tmp_path / "cache.0.f32", "r+b") as f:
+        f.write(b"GARBAGE!")
+
+    store = CacheStore(str(tmp_path), fsync=False, flush_interval_ms=0).open()
+    assert len(store) == 0 and store.generation == 1
+    assert (tmp_path / "cache.0.f32").exists()       # kept for inspection
+    assert store.extend([("what is rna", "another one", np.ones(4, dtype=np.float32))]) == 0
+    store.close()
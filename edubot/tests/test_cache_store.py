@@ -0,0 +1,106 @@
+import os
+import multiprocessing
+import numpy as np
+import pytest
+from services import cache_store
+from services.cache_store import CacheStore, _EMB_HEADER
+
+DIM = 8
+
+
+
+def vector(seed):
+    v = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+
+def open_store(directory):
+    return CacheStore(str(directory), fsync=False, flush_interval_ms=0).open()
+
+
+
+def assert_consistent(store):
+    rows = store.mapped_rows()
+    assert rows.shape == (len(store.questions), DIM)
+    for idx, question in enumerate(store.questions):
+        np.testing.assert_allclose(rows[idx], vector(int(question.split()[-1])), atol=1e-6)
+
+
+
+def test_replays_the_log_after_reopening(tmp_path):
+    store = open_store(tmp_path)
+    store.extend([(f"question {i}", f"answer {i}", vector(i)) for i in range(5)])
+    store.delete([1])     # below COMPACT_DEAD_RATIO, so the ids stay put
+    store.close()
+
+    store = open_store(tmp_path)
+    assert store.questions == [f"question {i}" for i in range(5)]
+    assert store.live == [True, False, True, True, True]
+    assert len(store) == 4
+    assert_consistent(store)
+    store.close()
+
+
+
+def test_truncates_a_torn_tail_on_open(tmp_path):
+    store = open_store(tmp_path)
+    store.extend([(f"question {i}", f"answer {i}", vector(i)) for i in range(3)])
+    log_path, emb_path = store._path(store.generation, "log"), store._path(store.generation, "f32")
+    log_size = os.path.getsize(log_path)
+    store.close()
+
+    with open(emb_path, "ab") as f:
+        f.write(vector(99).tobytes())   # a row whose record never made it
+    with open(log_path, "ab") as f:
+        f.write(cache_store._encode_record({"op": "add", "id": 3, "q": "question 99", "a": "x"})[:-5])
+
+    store = open_store(tmp_path)
+    assert len(store.questions) == 3
+    assert os.path.getsize(log_path) == log_size
+    assert os.path.getsize(emb_path) == _EMB_HEADER.size + 3 * 4 * DIM
+    assert_consistent(store)
+    store.close()
+
+
+
+def _die_mid_append(directory):
+    store = open_store(directory)
+    write = store._log.write
+
+    # both rows are written, the first record only in part
+    def torn_write(data):
+        write(data[:12])
+        store._log.flush()
+        os._exit(1)
+
+    store._log.write = torn_write
+    store.extend([("question 50", "answer", vector(50)), ("question 51", "answer", vector(51))])
+
+
+
+@pytest.mark.skipif(cache_store.fcntl is None, reason="needs flock and fork")
+def test_append_after_a_writer_died_mid_append(tmp_path):
+    store = open_store(tmp_path)
+    store.extend([(f"question {i}", f"answer {i}", vector(i)) for i in range(3)])
+    reader = open_store(tmp_path)
+
+    child = multiprocessing.get_context("fork").Process(target=_die_mid_append, args=(tmp_path,))
+    child.start()
+    child.join()
+    assert child.exitcode == 1
+
+    # the next writer repairs the tail before appending
+    assert store.extend([("question 7", "answer 7", vector(7))]) == 3
+    assert_consistent(store)
+
+    # and the other workers read past it
+    reader.refresh()
+    assert reader.questions == store.questions
+    assert_consistent(reader)
+
+    fresh = open_store(tmp_path)
+    assert fresh.questions == ["question 0", "question 1", "question 2", "question 7"]
+    assert_consistent(fresh)
+    for s in (store, reader, fresh):
+        s.close()
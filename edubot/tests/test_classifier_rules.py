@@ -0,0 +1,52 @@
+import pytest
+from services.classifier_service import rule_classify
+from config import CLASSIFIER_CONFIDENCE
+
+
+# (question, personal?) as the LLM classifier labels them
+LABELLED = [
+    ("what are my grades", True),
+    ("show my dbms marks", True),
+    ("what is my cgpa this semester", True),
+    ("did I pass the DBMS exam", True),
+    ("what did I score in the DBMS exam", True),
+    ("was I absent on monday", True),
+    ("which assignments have I submitted", True),
+    ("is my understanding of class inheritance right", False),
+    ("explain to me how grades are computed", False),
+    ("can you tell me what a deadlock is", False),
+    ("how are exam grades computed", False),
+    ("what is a binary search tree", False),
+    ("explain recursion with an example", False),
+    ("difference between tcp and udp", False),
+    ("tell me a joke", False),
+    ("normal forms in databases", False),
+]
+
+
+
+@pytest.mark.parametrize("question,personal", LABELLED)
+def test_confident_verdicts_match_the_labels(question, personal):
+    label, confidence = rule_classify(question)
+    if confidence >= CLASSIFIER_CONFIDENCE:
+        assert label == personal
+
+
+
+@pytest.mark.parametrize("question", [
+    "explain to me how grades are computed",       # "me" is not the student's record
+    "is my understanding of class inheritance right",
+    "how are exam grades computed",
+    "tell me a joke",
+    "normal forms in databases",
+])
+def test_unclear_questions_go_to_the_next_stage(question):
+    _, confidence = rule_classify(question)
+    assert confidence < CLASSIFIER_CONFIDENCE
+
+
+
+def test_rules_decide_the_clear_cases():
+    assert rule_classify("what are my grades") == (True, 0.97)
+    assert rule_classify("did I pass the DBMS exam")[0] is True
+    assert rule_classify("what is a binary search tree") == (False, 0.95)
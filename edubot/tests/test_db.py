@@ -0,0 +1,38 @@
+import mongomock
+import pytest
+import db
+from db import INDEXES, init_db, ensure_indexes, missing_indexes
+
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(db, "client", db.client)
+    monkeypatch.setattr(db, "db", db.db)
+    monkeypatch.setattr(db, "all_collections", list(db.all_collections))
+    return init_db(mongomock.MongoClient(), "edubot-test")
+
+
+
+def index_keys(database, name):
+    return {tuple(info["key"]) for info in database[name].index_information().values()}
+
+
+
+def test_ensure_indexes_creates_every_index(database):
+    created = ensure_indexes()
+    assert len(created) == sum(len(indexes) for indexes in INDEXES.values())
+    for name, indexes in INDEXES.items():
+        for keys in indexes:
+            assert tuple(keys) in index_keys(database, name)
+    assert missing_indexes() == []
+    # already there: nothing left to create
+    assert ensure_indexes() == []
+
+
+
+def test_a_dropped_index_is_reported_missing(database):
+    ensure_indexes()
+    keys = INDEXES["marks"][0]
+    database["marks"].drop_index(keys)
+    assert missing_indexes() == [("marks", keys)]
@@ -0,0 +1,78 @@
+from concurrent.futures import Future
+from services.embedding_service import EmbeddingMemo, EmbeddingBatcher
+
+
+
+def test_memo_hit_after_reopening(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    memo = EmbeddingMemo(max_size=10, path=path, save_interval=60)
+    memo.put("key", [1.0, 2.0, 3.0])
+    assert memo.get("key").tolist() == [1.0, 2.0, 3.0]
+    # not written until the saver runs
+    assert EmbeddingMemo(path=path).get("key") is None
+
+    memo.save()
+    reopened = EmbeddingMemo(max_size=10, path=path)
+    assert reopened.get_recent("key") is None
+    assert reopened.get("key").tolist() == [1.0, 2.0, 3.0]
+    assert reopened.get_recent("key") is not None
+
+
+
+def test_memo_evicts_the_least_recently_used():
+    memo = EmbeddingMemo(max_size=2, path="")
+    memo.put("a", [1.0])
+    memo.put("b", [2.0])
+    memo.get("a")
+    memo.put("c", [3.0])
+    assert memo.get("b") is None
+    assert memo.get("a") is not None and memo.get("c") is not None
+
+
+
+class CountingEmbedder:
+
+    def __init__(self):
+        self.calls = []
+
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+
+def test_duplicate_texts_in_a_batch_are_embedded_once():
+    embed = CountingEmbedder()
+    batcher = EmbeddingBatcher(embed, window_ms=200, max_batch=3)
+    futures = [batcher.submit(text) for text in ("what is dna", "what is dna", "what is rna")]
+    assert [future.result(timeout=5).tolist() for future in futures] == [[11.0], [11.0], [11.0]]
+    assert embed.calls == [["what is dna", "what is rna"]]
+
+
+
+def test_cancelled_futures_are_skipped():
+    embed = CountingEmbedder()
+    batcher = EmbeddingBatcher(embed)
+    cancelled, wanted = Future(), Future()
+    cancelled.cancel()
+    batcher._embed([("abandoned", cancelled), ("kept", wanted)])
+    assert embed.calls == [["kept"]]
+    assert wanted.result().tolist() == [4.0]
+
+    gone = Future()
+    gone.cancel()
+    batcher._embed([("abandoned", gone)])
+    assert len(embed.calls) == 1
+
+
+
+def test_a_failed_call_fails_every_future_of_the_batch():
+    def fail(texts):
+        raise RuntimeError("rate limited")
+
+    batcher = EmbeddingBatcher(fail)
+    first, second = Future(), Future()
+    batcher._embed([("a", first), ("b", second)])
+    for future in (first, second):
+        assert isinstance(future.exception(), RuntimeError)
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from services import metrics
+
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(metrics, "_timers", {})
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_collectors", [])
+
+
+
+def test_stage_quantiles_sum_and_count():
+    for ms in range(1, 101):
+        metrics.observe("llm.answer", ms / 1000)
+    lines = metrics.render().splitlines()
+
+    assert lines[0] == "# TYPE edubot_stage_seconds summary"
+    assert 'edubot_stage_seconds{stage="llm.answer",quantile="0.5"} 0.051000' in lines
+    assert 'edubot_stage_seconds{stage="llm.answer",quantile="0.95"} 0.096000' in lines
+    assert 'edubot_stage_seconds{stage="llm.answer",quantile="0.99"} 0.100000' in lines
+    assert 'edubot_stage_seconds_sum{stage="llm.answer"} 5.050000' in lines
+    assert 'edubot_stage_seconds_count{stage="llm.answer"} 100' in lines
+
+
+
+def test_counters_and_collectors_get_one_type_line_per_name():
+    metrics.inc("edubot_answers_total", source="personal")
+    metrics.inc("edubot_answers_total", 2, source="fresh_query")
+    metrics.register_collector(lambda: [("edubot_cache_entries", "gauge", {}, 42),
+                                        ("edubot_cache_lookups_total", "counter", {"result": "hit"}, 7)])
+    lines = metrics.render().splitlines()
+
+    assert lines.count("# TYPE edubot_answers_total counter") == 1
+    assert 'edubot_answers_total{source="fresh_query"} 2' in lines
+    assert 'edubot_answers_total{source="personal"} 1' in lines
+    assert "# TYPE edubot_cache_entries gauge" in lines
+    assert "edubot_cache_entries 42" in lines
+    assert 'edubot_cache_lookups_total{result="hit"} 7' in lines
+    # the TYPE line comes before the samples of its metric
+    assert lines.index("# TYPE edubot_answers_total counter") < lines.index('edubot_answers_total{source="personal"} 1')
+
+
+
+def test_label_values_are_escaped():
+    metrics.inc("edubot_errors_total", error='bad "quote"\\path\nnext line')
+    assert 'edubot_errors_total{error="bad \\"quote\\"\\\\path\\nnext line"} 1' in metrics.render().splitlines()
+
+
+
+def test_timed_functions_coroutines_and_generators():
+    @metrics.timed("sync")
+    def add(a, b):
+        return a + b
+
+    @metrics.timed("async")
+    async def aadd(a, b):
+        return a + b
+
+    @metrics.timed("stream")
+    def tokens():
+        yield from ("a", "b")
+
+    @metrics.timed("failing")
+    def fail():
+        raise ValueError("no")
+
+    assert add(1, 2) == 3
+    assert asyncio.run(aadd(1, 2)) == 3
+    assert list(tokens()) == ["a", "b"]
+    with pytest.raises(ValueError):
+        fail()
+    assert {stage: timer.count for stage, timer in metrics._timers.items()} == \
+        {"sync": 1, "async": 1, "stream": 1, "failing": 1}
@@ -0,0 +1,26 @@
+import json
+from services.plan_cache import PlanCache, EMAIL_PLACEHOLDER
+
+PIPELINE = [{"$match": {"email": "a@x.edu"}}, {"$lookup": {"from": "marks", "as": "marks"}}]
+
+
+
+def test_plans_are_shared_between_students(tmp_path):
+    plans = PlanCache(str(tmp_path / "plans.json"), save_interval=0)
+    assert plans.put("what are my marks", "a@x.edu", PIPELINE)
+    assert plans.get("what are my marks", "b@x.edu")[0] == {"$match": {"email": "b@x.edu"}}
+
+
+
+def test_new_plans_are_saved_in_batches(tmp_path):
+    path = tmp_path / "plans.json"
+    plans = PlanCache(str(path), save_interval=3600)
+    plans.put("what are my marks", "a@x.edu", PIPELINE)
+    plans.put("what is my attendance", "a@x.edu", PIPELINE)
+    assert not path.exists()        # nothing written on the request thread
+
+    plans.save()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert len(saved["plans"]) == 2
+    assert EMAIL_PLACEHOLDER in json.dumps(saved["plans"])
+    assert PlanCache(str(path)).get("what is my attendance", "c@x.edu") is not None
@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+import pytest
+from db import COLLECTION_NAMES
+from services.query_service import route_pipeline, _route
+
+EMAIL = "a@x.edu"
+STUDENT = "65f1c2aa11bb22cc33dd44ee"
+
+# collections with a studentId field
+BY_STUDENT = ["marks", "attendances", "professorremarks"]
+
+
+
+def route(*stages):
+    targets = route_pipeline(list(stages))
+    return sorted(targets) if targets is not None else None
+
+
+
+def test_plain_match():
+    assert route({"$match": {"email": EMAIL}}) == ["users"]
+    assert route({"$match": {"studentId": STUDENT, "score": {"$gt": 5}}}) == ["marks"]
+    assert route({"$match": {"studentId": STUDENT}}, {"$sort": {"date": -1}}, {"$limit": 5}) == sorted(BY_STUDENT)
+
+
+
+def test_and_requires_the_fields_of_every_clause():
+    assert route({"$match": {"$and": [{"studentId": STUDENT}, {"date": "2025-01-01"}]}}) == ["attendances"]
+
+
+
+def test_or_requires_only_the_fields_shared_by_every_branch():
+    match = {"$or": [{"studentId": STUDENT, "score": {"$lt": 4}}, {"studentId": STUDENT, "status": "absent"}]}
+    assert route({"$match": match}) == sorted(BY_STUDENT)
+
+
+
+def test_nested_or_inside_and():
+    match = {"$and": [{"studentId": STUDENT}, {"$or": [{"score": 10}, {"score": {"$gt": 8}, "type": "quiz"}]}]}
+    assert route({"$match": match}) == ["marks"]
+
+
+
+@pytest.mark.parametrize("condition", [
+    None,
+    {"$exists": False},
+    {"$ne": "graded"},
+    {"$nin": ["graded"]},
+    {"$not": {"$eq": "graded"}},
+    {"$eq": None},
+    {"$in": [None, "graded"]},
+])
+def test_conditions_matching_a_missing_field_do_not_require_it(condition):
+    # "grade" is only in assignmentsubmissions, which has no studentId
+    assert route({"$match": {"studentId": STUDENT, "grade": condition}}) == sorted(BY_STUDENT)
+
+
+
+def test_nor_is_ignored():
+    assert route({"$match": {"studentId": STUDENT, "$nor": [{"grade": "A"}]}}) == sorted(BY_STUDENT)
+
+
+
+def test_lookup_requires_its_local_field_and_derives_its_output():
+    pipeline = [
+        {"$match": {"email": EMAIL}},
+        {"$lookup": {"from": "marks", "localField": "_id", "foreignField": "studentId", "as": "marks"}},
+        {"$unwind": "$marks"},
+        {"$match": {"marks.score": {"$gt": 5}}},
+    ]
+    assert route(*pipeline) == ["users"]
+
+    pipeline = [
+        {"$lookup": {"from": "courses", "localField": "courseId", "foreignField": "_id", "as": "course"}},
+        {"$match": {"studentId": STUDENT, "course.title": "Algorithms"}},
+    ]
+    assert route(*pipeline) == sorted(BY_STUDENT)
+
+
+
+def test_added_fields_are_not_required():
+    pipeline = [{"$addFields": {"percent": {"$divide": ["$score", "$maxScore"]}}},
+                {"$match": {"studentId": STUDENT, "percent": {"$gt": 0.5}}}]
+    assert route(*pipeline) == sorted(BY_STUDENT)
+
+
+
+@pytest.mark.parametrize("pipeline", [
+    [{"$match": {"$expr": {"$gt": ["$score", 5]}}}],
+    [{"$group": {"_id": "$studentId"}}, {"$match": {"studentId": STUDENT}}],
+    [{"$match": {"_id": STUDENT}}],
+    [{"$match": {"notAField": 1}}],
+    [],
+])
+def test_unroutable_pipelines_fan_out_to_every_collection(pipeline):
+    assert route_pipeline(pipeline) is None
+    collections = [SimpleNamespace(name=name) for name in COLLECTION_NAMES]
+    assert _route(pipeline, collections) == collections
+
+
+
+def test_routed_pipelines_only_reach_their_collections():
+    collections = [SimpleNamespace(name=name) for name in COLLECTION_NAMES]
+    routed = _route([{"$match": {"email": EMAIL}}], collections)
+    assert [collection.name for collection in routed] == ["users"]
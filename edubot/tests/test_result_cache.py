@@ -0,0 +1,109 @@
+from pymongo.errors import OperationFailure
+from services import result_cache
+from services.result_cache import ResultCache
+
+PIPELINE = [{"$match": {"email": "a@x.edu"}}]
+
+
+
+def test_results_read_before_an_invalidation_are_not_cached():
+    cache = ResultCache(watch=False)
+    generation = cache.generation("a@x.edu")
+    cache.invalidate_email("a@x.edu")         # a write reported while the query ran
+    cache.put_results("a@x.edu", PIPELINE, "stale grades", generation)
+    assert cache.get_results("a@x.edu", PIPELINE) is None
+
+    generation = cache.generation("a@x.edu")
+    cache.put_results("a@x.edu", PIPELINE, "fresh grades", generation)
+    assert cache.get_results("a@x.edu", PIPELINE) == "fresh grades"
+
+
+
+def test_clear_invalidates_reads_in_flight_for_everyone():
+    cache = ResultCache(watch=False)
+    generation = cache.generation("b@x.edu")
+    cache.clear()
+    cache.put_results("b@x.edu", PIPELINE, "stale grades", generation)
+    assert cache.get_results("b@x.edu", PIPELINE) is None
+
+
+
+def test_other_students_are_unaffected():
+    cache = ResultCache(watch=False)
+    generation = cache.generation("b@x.edu")
+    cache.invalidate_email("a@x.edu")
+    cache.put_results("b@x.edu", PIPELINE, "grades", generation)
+    assert cache.get_results("b@x.edu", PIPELINE) == "grades"
+
+
+
+
+# change streams handed out in turn by watch(); an exception is raised instead of being streamed
+class FakeDatabase:
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.opened = 0
+
+
+    def watch(self, pipeline, **kwargs):
+        self.opened += 1
+        stream = self.streams.pop(0)
+        if isinstance(stream, Exception):
+            raise stream
+        return FakeStream(stream)
+
+
+    def __getitem__(self, name):
+        return FakeCollection()
+
+
+
+class FakeStream(list):
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        return False
+
+
+
+class FakeCollection:
+
+    def find_one(self, *args, **kwargs):
+        return None
+
+
+
+def watch(monkeypatch, database, cache):
+    monkeypatch.setattr(result_cache.db, "get_db", lambda: database)
+    cache._watch_changes()
+
+
+
+def test_an_invalidated_stream_clears_the_cache_and_is_reopened(monkeypatch):
+    cache = ResultCache(watch=False)
+    cache.put_results("a@x.edu", PIPELINE, "grades")
+    database = FakeDatabase(
+        [{"operationType": "invalidate"}, {"operationType": "insert", "ns": {"db": "x", "coll": "marks"}}],
+        [{"operationType": "update", "ns": {"db": "x", "coll": "users"}, "fullDocument": {"email": "b@x.edu"}}],
+        OperationFailure("change streams need a replica set"),
+    )
+    watch(monkeypatch, database, cache)
+
+    assert database.opened == 3
+    assert cache.get_results("a@x.edu", PIPELINE) is None
+    assert cache.epoch == 1                 # the event after the invalidate was never read
+    assert cache.generations == {"b@x.edu": 1}
+
+
+
+def test_events_without_a_collection_clear_the_cache(monkeypatch):
+    cache = ResultCache(watch=False)
+    cache.put_results("a@x.edu", PIPELINE, "grades")
+    database = FakeDatabase([{"operationType": "dropDatabase", "ns": {"db": "x"}}], OperationFailure("stop"))
+    watch(monkeypatch, database, cache)
+    assert cache.get_results("a@x.edu", PIPELINE) is None
+    assert cache.epoch == 1
@@ -0,0 +1,92 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from services.singleflight import SingleFlight
+
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+
+# four callers for one key; the function runs once and returns or raises `outcome`
+def run_concurrently(flight, outcome):
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(1)
+        release.wait(5)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def call():
+        try:
+            return flight.do("what is dna", fn)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = [pool.submit(call) for _ in range(4)]
+        wait_until(lambda: flight.shared == 3)
+        release.set()
+        return [result.result() for result in results], runs
+
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    results, runs = run_concurrently(flight, "a molecule")
+    assert results == ["a molecule"] * 4
+    assert len(runs) == 1 and flight.calls == 1
+
+
+
+def test_concurrent_callers_share_the_exception():
+    flight = SingleFlight()
+    error = RuntimeError("rate limited")
+    results, runs = run_concurrently(flight, error)
+    assert all(result is error for result in results)
+    assert len(runs) == 1
+
+
+
+def test_a_later_call_runs_again():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    assert flight.calls == 2 and flight.shared == 0
+    with pytest.raises(ValueError):
+        flight.do("key", lambda: int("x"))
+    assert flight.do("key", lambda: 3) == 3
+
+
+
+def test_coroutines_share_one_call_and_a_cancelled_caller_does_not_cancel_it():
+    flight = SingleFlight()
+    runs = []
+
+    async def fn():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        first = asyncio.create_task(flight.ado("key", fn))
+        others = [asyncio.create_task(flight.ado("key", fn)) for _ in range(3)]
+        await asyncio.sleep(0)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        later = await flight.ado("key", fn)
+        return results, later
+
+    results, later = asyncio.run(main())
+    assert results == ["answer"] * 3
+    assert later == "answer" and len(runs) == 2
@@ -0,0 +1,68 @@
+import random
+import numpy as np
+import pytest
+from services.topic_index import TopicIndex
+
+
+
+# the rule search_similar applies to the candidates
+def same_topic(query_topic, cached_topic):
+    return query_topic in cached_topic or cached_topic in query_topic
+
+
+
+def build(topics, live=None):
+    index = TopicIndex(max_candidates=1.0)
+    index.rebuild(topics, live or [True] * len(topics))
+    return index
+
+
+
+@pytest.mark.parametrize("query_topic,cached_topic", [
+    ("cell", "cellular respiration"),
+    ("class", "classes in python"),
+    ("mitochondria", "mitochondrial dna"),
+    ("cellular respiration", "cell"),
+    ("newton laws", "laws"),
+    ("ai", "explain ai"),
+])
+def test_topics_inside_each_other_are_candidates(query_topic, cached_topic):
+    assert same_topic(query_topic, cached_topic)
+    candidates = build(["photosynthesis", cached_topic, "world war"]).candidates(query_topic)
+    assert candidates is None or 1 in candidates.tolist()
+
+
+
+def test_unrelated_topics_are_not_candidates():
+    index = build(["photosynthesis", "cellular respiration", "world war", "sorting algorithms"])
+    assert index.candidates("cell").tolist() == [1]
+    assert index.candidates("sorting").tolist() == [3]
+
+
+
+def test_short_topics_fall_back_to_a_full_search():
+    index = build(["photosynthesis", "ai"])
+    assert index.candidates("ai") is None
+    # a short cached topic may be inside any query topic
+    assert 1 in index.candidates("explain ai").tolist()
+
+
+
+def test_dead_entries_are_skipped():
+    index = build(["cell biology", "cell division"], live=[False, True])
+    assert index.candidates("cell").tolist() == [1]
+
+
+
+def test_candidates_are_the_entries_the_substring_rule_keeps():
+    rng = random.Random(7)
+    words = "cell cellular class classes mitochondria mitochondrial dna law laws newton python in on of".split()
+    topics = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) for _ in range(300)]
+    index = build(topics)
+    for query_topic in topics[:100]:
+        expected = {idx for idx, topic in enumerate(topics) if same_topic(query_topic, topic)}
+        candidates = index.candidates(query_topic)
+        if len(query_topic) < 3:
+            assert candidates is None
+        else:
+            assert set(candidates.tolist()) == expected
@@ -0,0 +1,34 @@
+import pytest
+from utils import normalize_question
+
+
+
+@pytest.mark.parametrize("first,second", [
+    ("What is C?", "What is C#?"),
+    ("What is .NET?", "What is net?"),
+    ("how do I send an e-mail", "how do I send an e mail"),
+    ("what is c++", "what is c"),
+])
+def test_punctuation_inside_words_keeps_questions_apart(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+
+@pytest.mark.parametrize("variant", [
+    "what is recursion",
+    "What is Recursion?",
+    "  what   is\trecursion ?",
+    "WHAT IS RECURSION!",
+    "What is recursion...",
+    'What is "recursion"?',
+])
+def test_case_spacing_and_trailing_punctuation_are_folded(variant):
+    assert normalize_question(variant) == "what is recursion"
+
+
+
+def test_kept_punctuation():
+    assert normalize_question("What is C#?") == "what is c#"
+    assert normalize_question("What is .NET?") == "what is .net"
+    assert normalize_question("What's an e-mail, anyway?") == "what's an e-mail anyway"
+    assert normalize_question("(C++)") == "c++"
@@ -0,0 +1,59 @@
+import numpy as np
+from services.vector_index import VectorIndex, evaluate_index, normalize
+
+
+
+# rows drawn around a few hundred topics, like questions on the same subjects
+def clustered(n, dim, topics, rng):
+    centers = normalize(rng.standard_normal((topics, dim)))
+    return normalize(centers[rng.integers(0, topics, n)] + 0.6 * normalize(rng.standard_normal((n, dim))))
+
+
+
+def test_exact_search_ranks_by_cosine_similarity():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50, 16))
+    index = VectorIndex(ann_min_size=10 ** 6)
+    index.rebuild(vectors)
+
+    query = rng.standard_normal(16)
+    ids, scores = index.search(query, k=5)
+    expected = normalize(vectors) @ normalize(query)
+    assert ids.tolist() == np.argsort(expected)[::-1][:5].tolist()
+    assert np.allclose(scores, expected[ids], atol=1e-5)
+
+
+
+def test_min_score_and_ids_filter_the_results():
+    index = VectorIndex(ann_min_size=10 ** 6)
+    index.rebuild(np.eye(4))
+    ids, _ = index.search([1, 0.1, 0, 0], min_score=0.5)
+    assert ids.tolist() == [0]
+    ids, _ = index.search([1, 0.1, 0, 0], ids=np.array([1, 2, 3]))
+    assert ids.tolist()[0] == 1
+    assert len(index.search([1, 0, 0, 0], ids=np.empty(0, dtype=np.int64))[0]) == 0
+
+
+
+def test_ivf_recall_against_exact_search():
+    rng = np.random.default_rng(1)
+    vectors = clustered(4000, 32, 60, rng)
+    index = VectorIndex(ann_min_size=1000, nprobe=8)
+    index.rebuild(vectors[:3000])
+    for vector in vectors[3000:]:       # rows added after training go to the lists too
+        index.add(vector)
+    assert index._ivf is not None and len(index._ivf) == 4000
+
+    queries = clustered(100, 32, 60, np.random.default_rng(1))
+    assert evaluate_index(index, queries, k=10)["recall_at_k"] >= 0.9
+
+
+
+def test_an_added_row_is_found_right_away():
+    rng = np.random.default_rng(2)
+    index = VectorIndex(ann_min_size=500)
+    index.rebuild(clustered(1000, 32, 20, rng))
+    vector = normalize(rng.standard_normal(32))
+    idx = index.add(vector)
+    ids, scores = index.search(vector, k=1)
+    assert ids.tolist() == [idx] and scores[0] > 0.999
@@ -1,5 +1,6 @@
 import json
 import traceback
+import unicodedata
 from config import logger
 
 
@@ -9,8 +10,51 @@ def serialize_results(results):
 
 
 
+# one server-sent event carrying a JSON payload
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+
 def handle_exception(e):
     error_message = str(e)
     logger.error(f"Error: {error_message}")
     logger.error(traceback.format_exc())
-    return error_message
\ No newline at end of file
+    return error_message
+
+
+
+# punctuation kept at the edges of a word: "c#", ".net", "#include"
+KEEP_TRAILING = "#"
+KEEP_LEADING = "#."
+
+
+
+def _punctuation(ch):
+    return unicodedata.category(ch).startswith("P")
+
+
+
+# canonical form of a question for exact-match lookups: NFKC, case-folded,
+# whitespace collapsed and punctuation stripped from the edges of each word.
+# Punctuation inside a word is kept, so "c#", ".net" and "e-mail" don't
+# collide with "c", "net" and "e mail".
+def normalize_question(text):
+    words = []
+    for word in unicodedata.normalize("NFKC", text).casefold().split():
+        while word and _punctuation(word[-1]) and word[-1] not in KEEP_TRAILING:
+            word = word[:-1]
+        while word and _punctuation(word[0]) and word[0] not in KEEP_LEADING:
+            word = word[1:]
+        if word:
+            words.append(word)
+    return " ".join(words)
+
+
+
+# main topic of a question: whatever follows "on " or else "about "
+def extract_main_topic(query):
+    topic = query.split("on ")[-1].strip().lower()
+    if topic == query.lower():  # if "on" wasn't found
+        topic = query.split("about ")[-1].strip().lower()
+    return topic